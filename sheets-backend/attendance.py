@@ -1,9 +1,17 @@
-# backend/app/routers/attendance.py
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from typing import List, Optional
-import sqlite3
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Depends
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app_logging import get_logger
+from auth import verify_token
+from database import get_db
+from models import Class
+from sheet_store import sheet_store
+
+logger = get_logger("attendance")
 
 router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 
@@ -13,37 +21,56 @@ class StudentAttendance(BaseModel):
     attendance: List[str]
 
 class AttendanceSheet(BaseModel):
-    classId: int
+    classId: Union[int, str]
     className: str
-    month: int
-    year: int
+    month: int = Field(ge=1, le=12)
+    year: int = Field(ge=2000, le=9999)
     students: Optional[List[StudentAttendance]] = []
     thresholds: dict
 
-# In-memory storage (replace with real DB later)
-attendance_data: dict = {}
+async def require_own_class(db: AsyncSession, class_id: str, auth_data: dict):
+    """404 unless the caller is the teacher who owns the class"""
+    if auth_data["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can access attendance sheets")
+    result = await db.execute(
+        select(Class.id)
+        .where(Class.id == class_id)
+        .where(Class.teacher_id == auth_data["id"])
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Class not found")
 
 @router.post("/save")
-async def save_attendance(sheet: AttendanceSheet):
+async def save_attendance(sheet: AttendanceSheet, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Save attendance sheet for class/month"""
-    key = f"{sheet.classId}_{sheet.month}_{sheet.year}"
-    attendance_data[key] = sheet.dict()
+    class_id = str(sheet.classId)
+    await require_own_class(db, class_id, auth_data)
+    key = f"{class_id}_{sheet.month}_{sheet.year}"
+    
+    try:
+        await sheet_store.save(db, class_id, sheet.year, sheet.month, sheet.model_dump())
+    except IntegrityError:
+        # attendance_sheets.class_id references classes.id; the class was deleted meanwhile
+        raise HTTPException(status_code=404, detail="Class not found")
     
-    print(f"💾 SAVED: {sheet.className} - {len(sheet.students)} students")
+    logger.debug("Saved sheet %s with %d students", sheet.className, len(sheet.students))
     return {"status": "saved", "key": key, "students_count": len(sheet.students)}
 
 @router.get("/load/{class_id}")
 async def load_attendance(
-    class_id: int, 
+    class_id: str, 
     month: int = Query(1, ge=1, le=12), 
-    year: int = Query(2025, ge=2000)
+    year: int = Query(2025, ge=2000, le=9999),
+    auth_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Load attendance sheet for class/month"""
-    key = f"{class_id}_{month}_{year}"
+    await require_own_class(db, class_id, auth_data)
+    sheet = await sheet_store.load(db, class_id, year, month)
     
-    if key in attendance_data:
-        print(f"📂 LOADED: Class {class_id} - {month}/{year}")
-        return attendance_data[key]
+    if sheet is not None:
+        logger.debug("Loaded sheet for class %s %d/%d", class_id, month, year)
+        return sheet
     
-    print(f"📭 No data found for: {class_id}/{month}/{year}")
+    logger.debug("No sheet for class %s %d/%d", class_id, month, year)
     raise HTTPException(status_code=404, detail="No attendance data found")
@@ -0,0 +1,130 @@
+import calendar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, date
+from sqlalchemy import select, update, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Class, AttendanceMark
+
+# Status codes stored in attendance_marks.status
+VALID_STATUSES = ("P", "A", "L")
+
+# Postgres caps bind parameters per statement, so bulk writes go in chunks
+WRITE_CHUNK_SIZE = 5000
+
+# Inclusive (first_day, last_day) range of marks to load
+DateWindow = Tuple[date, date]
+
+def month_window(year: int, month: int) -> DateWindow:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def parse_mark_date(value: Any) -> date:
+    """A client date key ("2025-12-06" or the unpadded "2025-12-6") as a date; ValueError if it isn't one"""
+    if isinstance(value, date):
+        return value
+    year, month, day = (int(part) for part in str(value).split("-"))
+    return date(year, month, day)
+
+def in_window(window: DateWindow):
+    """Filter for marks dated inside an inclusive window; a range scan on the primary key"""
+    return AttendanceMark.date.between(*window)
+
+async def load_attendance(db: AsyncSession, record_ids: Iterable[int], window: Optional[DateWindow] = None) -> Dict[int, Dict[str, str]]:
+    """Load {"YYYY-MM-DD": status} maps for many student records in one query, optionally only inside a date window"""
+    record_ids = list(record_ids)
+    attendance = {record_id: {} for record_id in record_ids}
+    if not record_ids:
+        return attendance
+
+    query = (
+        select(AttendanceMark.student_record_id, AttendanceMark.date, AttendanceMark.status)
+        .where(AttendanceMark.student_record_id.in_(record_ids))
+    )
+    if window is not None:
+        query = query.where(in_window(window))
+    result = await db.execute(query)
+    for record_id, day, mark in result:
+        attendance[record_id][day.isoformat()] = mark
+
+    return attendance
+
+async def count_marks(db: AsyncSession, record_id: int) -> int:
+    """Number of dates marked for a student record"""
+    result = await db.execute(
+        select(func.count()).where(AttendanceMark.student_record_id == record_id)
+    )
+    return result.scalar()
+
+async def upsert_marks(db: AsyncSession, rows: List[dict]):
+    """Insert or overwrite marks given as {student_record_id, date, status} rows"""
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        stmt = insert(AttendanceMark).values(rows[start:start + WRITE_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AttendanceMark.student_record_id, AttendanceMark.date],
+            set_={"status": stmt.excluded.status}
+        )
+        await db.execute(stmt)
+
+async def delete_marks(db: AsyncSession, keys: List[tuple]):
+    """Delete marks given as (student_record_id, date) pairs"""
+    for start in range(0, len(keys), WRITE_CHUNK_SIZE):
+        await db.execute(
+            delete(AttendanceMark)
+            .where(tuple_(AttendanceMark.student_record_id, AttendanceMark.date).in_(keys[start:start + WRITE_CHUNK_SIZE]))
+        )
+
+async def set_mark(db: AsyncSession, record_id: int, day: date, mark: str):
+    """Set a single attendance cell"""
+    await upsert_marks(db, [{"student_record_id": record_id, "date": day, "status": mark}])
+
+def mark_rows(record_id: int, attendance: Dict[str, Any]) -> List[dict]:
+    """Turn a client {date: status} map into mark rows, skipping empty cells and keys that aren't dates"""
+    rows = {}
+    for key, mark in (attendance or {}).items():
+        if mark not in VALID_STATUSES:
+            continue
+        try:
+            day = parse_mark_date(key)
+        except ValueError:
+            continue
+        rows[day] = {"student_record_id": record_id, "date": day, "status": mark}
+    return list(rows.values())
+
+async def sync_attendance(db: AsyncSession, desired: Dict[int, Dict[str, Any]], current: Optional[Dict[int, Dict[str, str]]] = None):
+    """Make stored marks match full {date: status} maps sent by the client.
+
+    Only cells that actually changed are written, so saving a sheet after one
+    click touches one row instead of every student's history.
+    """
+    if current is None:
+        current = await load_attendance(db, desired.keys())
+
+    changed = []
+    removed = []
+    for record_id, attendance in desired.items():
+        wanted = {row["date"].isoformat(): row for row in mark_rows(record_id, attendance)}
+        stored = current[record_id]
+        changed.extend(row for key, row in wanted.items() if stored.get(key) != row["status"])
+        removed.extend((record_id, parse_mark_date(key)) for key in stored if key not in wanted)
+
+    await delete_marks(db, removed)
+    await upsert_marks(db, changed)
+    return len(changed), len(removed)
+
+async def bump_sheet_version(db: AsyncSession, class_id: str, base_version: Optional[int] = None) -> Optional[int]:
+    """Increment a class's sheet version and return it.
+
+    With base_version set, the bump only happens if the stored version still
+    matches; None is returned otherwise so the caller can report a conflict.
+    """
+    stmt = (
+        update(Class)
+        .where(Class.id == class_id)
+        .values(version=Class.version + 1, updated_at=datetime.utcnow())
+        .returning(Class.version)
+    )
+    if base_version is not None:
+        stmt = stmt.where(Class.version == base_version)
+
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
@@ -0,0 +1,139 @@
+from typing import Dict, Iterable
+from sqlalchemy import select, func, case, and_, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Class, Enrollment, StudentRecord, AttendanceMark
+
+DEFAULT_THRESHOLDS = {
+    "excellent": 95.0,
+    "good": 90.0,
+    "moderate": 85.0,
+    "atRisk": 85.0
+}
+
+def class_thresholds(cls: Class) -> dict:
+    return cls.thresholds or dict(DEFAULT_THRESHOLDS)
+
+def attendance_status(percentage: float, thresholds: dict) -> str:
+    """Bucket an attendance percentage using a class's thresholds"""
+    if percentage >= thresholds.get("excellent", 95.0):
+        return "excellent"
+    elif percentage >= thresholds.get("good", 90.0):
+        return "good"
+    elif percentage >= thresholds.get("moderate", 85.0):
+        return "moderate"
+    return "at risk"
+
+def mark_count_columns(*group_by):
+    """Columns counting each status per group, computed by the database"""
+    return (
+        *group_by,
+        func.count(AttendanceMark.status).filter(AttendanceMark.status == "P").label("present"),
+        func.count(AttendanceMark.status).filter(AttendanceMark.status == "A").label("absent"),
+        func.count(AttendanceMark.status).filter(AttendanceMark.status == "L").label("late"),
+        func.count(AttendanceMark.status).label("total"),
+    )
+
+async def mark_totals(db: AsyncSession, record_ids: Iterable[int]) -> Dict[int, dict]:
+    """All-time {present, absent, late, total} per student record, in one query"""
+    record_ids = list(record_ids)
+    totals = {record_id: {"present": 0, "absent": 0, "late": 0, "total": 0} for record_id in record_ids}
+    if not record_ids:
+        return totals
+
+    result = await db.execute(
+        select(*mark_count_columns(AttendanceMark.student_record_id))
+        .where(AttendanceMark.student_record_id.in_(record_ids))
+        .group_by(AttendanceMark.student_record_id)
+    )
+    for row in result:
+        totals[row.student_record_id] = {"present": row.present, "absent": row.absent, "late": row.late, "total": row.total}
+    return totals
+
+async def student_statistics(db: AsyncSession, records: Dict[int, dict]) -> Dict[int, dict]:
+    """Per-student statistics for {student_record_id: thresholds}.
+
+    Returns the `statistics` objects the student endpoints expose.
+    """
+    if not records:
+        return {}
+
+    result = await db.execute(
+        select(*mark_count_columns(AttendanceMark.student_record_id))
+        .where(AttendanceMark.student_record_id.in_(list(records)))
+        .group_by(AttendanceMark.student_record_id)
+    )
+    counts = {row.student_record_id: row for row in result}
+
+    statistics = {}
+    for record_id, thresholds in records.items():
+        row = counts.get(record_id)
+        present, absent, late, total = (row.present, row.absent, row.late, row.total) if row else (0, 0, 0, 0)
+        percentage = ((present + late) / total * 100) if total > 0 else 0.0
+        statistics[record_id] = {
+            "total_classes": total,
+            "present": present,
+            "absent": absent,
+            "late": late,
+            "percentage": round(percentage, 3),
+            "status": attendance_status(percentage, thresholds)
+        }
+    return statistics
+
+async def class_statistics(db: AsyncSession, classes: Iterable[Class]) -> Dict[str, dict]:
+    """Per-class summaries over actively enrolled students, in one query.
+
+    Students without any marks count towards the average as 0% but are
+    left out of the excellent / at-risk buckets.
+    """
+    classes = list(classes)
+    empty = {"total_students": 0, "avg_attendance": 0.0, "at_risk_count": 0, "excellent_count": 0}
+    if not classes:
+        return {}
+
+    per_student = (
+        select(*mark_count_columns(StudentRecord.class_id, StudentRecord.id))
+        .join(Enrollment, and_(
+            Enrollment.student_record_id == StudentRecord.id,
+            Enrollment.class_id == StudentRecord.class_id
+        ))
+        .outerjoin(AttendanceMark, AttendanceMark.student_record_id == StudentRecord.id)
+        .where(StudentRecord.class_id.in_([cls.id for cls in classes]))
+        .where(Enrollment.status == "active")
+        .group_by(StudentRecord.class_id, StudentRecord.id)
+        .subquery()
+    )
+
+    percentage = case(
+        (per_student.c.total > 0, (per_student.c.present + per_student.c.late) * 100.0 / per_student.c.total),
+        else_=literal(0.0)
+    )
+    thresholds = {cls.id: class_thresholds(cls) for cls in classes}
+    excellent_at = case(
+        {cid: t.get("excellent", 95.0) for cid, t in thresholds.items()},
+        value=per_student.c.class_id
+    )
+    moderate_at = case(
+        {cid: t.get("moderate", 85.0) for cid, t in thresholds.items()},
+        value=per_student.c.class_id
+    )
+
+    result = await db.execute(
+        select(
+            per_student.c.class_id,
+            func.count().label("total_students"),
+            func.avg(percentage).label("avg_attendance"),
+            func.count().filter(and_(per_student.c.total > 0, percentage >= excellent_at)).label("excellent_count"),
+            func.count().filter(and_(per_student.c.total > 0, percentage < moderate_at)).label("at_risk_count"),
+        )
+        .group_by(per_student.c.class_id)
+    )
+
+    statistics = {cls.id: dict(empty) for cls in classes}
+    for row in result:
+        statistics[row.class_id] = {
+            "total_students": row.total_students,
+            "avg_attendance": round(float(row.avg_attendance or 0.0), 3),
+            "at_risk_count": row.at_risk_count,
+            "excellent_count": row.excellent_count
+        }
+    return statistics
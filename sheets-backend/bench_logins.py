@@ -0,0 +1,99 @@
+"""Load benchmark for concurrent logins.
+
+    python bench_logins.py --logins 40 --concurrency 20
+
+Creates a throwaway teacher whose password is hashed at the configured
+PASSWORD_HASH_ITERATIONS in the database named by DATABASE_URL, sends
+--logins POST /auth/login requests through the app in-process, and reports
+logins per second next to what running every PBKDF2 verification on the
+event loop one after another would allow. A ticker task measures how late
+the event loop wakes up while the logins run; with hashing in the
+PASSWORD_HASH_WORKERS thread pool it should stay far below the cost of one
+hash, where hashing on the loop would stall it for a hash at a time.
+
+Everything the run creates is deleted afterwards. Needs httpx
+(requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+os.environ.setdefault("MAIL_BACKEND", "memory")
+
+import httpx
+from sqlalchemy import delete
+
+import main
+import passwords
+from database import AsyncSessionLocal, engine, init_db
+from models import Teacher
+
+PASSWORD = "bench-password"
+
+async def create_teacher() -> Teacher:
+    suffix = uuid.uuid4().hex[:12]
+    teacher = Teacher(id=f"bench_teacher_{suffix}", email=f"bench_teacher_{suffix}@example.com", name="Bench",
+                      password=await passwords.hash_password(PASSWORD))
+    async with AsyncSessionLocal() as db:
+        db.add(teacher)
+        await db.commit()
+    return teacher
+
+async def watch_loop(lags: list, interval: float = 0.005):
+    """Record how much later than asked each short sleep wakes up"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+async def run(logins: int, concurrency: int) -> bool:
+    await init_db()
+    teacher = await create_teacher()
+
+    # One verification inline, as login used to do it, to price a serialized run
+    started = time.perf_counter()
+    passwords._verify_sync(PASSWORD, teacher.password)
+    hash_time = time.perf_counter() - started
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    lags = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def login() -> bool:
+                async with semaphore:
+                    response = await client.post("/auth/login", json={"email": teacher.email, "password": PASSWORD})
+                    return response.status_code == 200
+
+            await login()  # warm up the pool and the app
+            watcher = asyncio.create_task(watch_loop(lags))
+            started = time.perf_counter()
+            results = await asyncio.gather(*(login() for _ in range(logins)))
+            elapsed = time.perf_counter() - started
+            watcher.cancel()
+
+        succeeded = sum(results)
+        serialized = hash_time * logins
+        print(f"logins={logins} concurrency={concurrency} iterations={passwords.PASSWORD_HASH_ITERATIONS} "
+              f"hash_workers={passwords.PASSWORD_HASH_WORKERS}")
+        print(f"one PBKDF2 verification takes {hash_time * 1000:.0f}ms")
+        print(f"{succeeded}/{logins} logins in {elapsed:.2f}s ({succeeded / elapsed:.1f} logins/s); "
+              f"serialized on the loop they would take at least {serialized:.2f}s ({logins / serialized:.1f} logins/s)")
+        print(f"event loop lag while logging in: max {max(lags, default=0) * 1000:.1f}ms "
+              f"over {len(lags)} ticks (one hash on the loop would stall it {hash_time * 1000:.0f}ms)")
+        return succeeded == logins
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Teacher).where(Teacher.id == teacher.id))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.logins, args.concurrency))
+    raise SystemExit(0 if ok else 1)
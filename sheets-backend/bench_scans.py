@@ -0,0 +1,136 @@
+"""Load benchmark for QR scan ingestion.
+
+    python bench_scans.py --students 500 --concurrency 100 [--orphans 5]
+
+Creates a throwaway teacher, class, enrolled students and an active QR
+session in the database named by DATABASE_URL, sends one POST /qr/scan per
+student through the app in-process, and reports accepted scans per second
+and how many accepted scans never reached qr_scans / attendance_marks.
+
+--orphans deletes that many students' records after their scans were
+accepted but before they are flushed - the case that used to fail the whole
+batch. Those scans are expected to be dropped; every other one must land.
+With --orphans the background flusher is not started, so the flush happens
+after the deletes.
+
+Everything the run creates is deleted afterwards. Needs httpx
+(requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("MAIL_BACKEND", "memory")
+
+import httpx
+from sqlalchemy import select, delete, func
+
+import main
+import qr_codes
+from database import AsyncSessionLocal, engine, init_db
+from models import Teacher, Student, Class, StudentRecord, Enrollment, QRSession, QRScan, AttendanceMark
+from scan_ingest import scan_ingestor
+
+async def create_fixture(students: int):
+    suffix = uuid.uuid4().hex[:12]
+    teacher = Teacher(id=f"bench_teacher_{suffix}", email=f"bench_teacher_{suffix}@example.com", name="Bench", password="-")
+    class_id = f"bench_class_{suffix}"
+    tokens = {}
+    async with AsyncSessionLocal() as db:
+        db.add(teacher)
+        db.add(Class(id=class_id, name="Bench class", teacher_id=teacher.id))
+        await db.flush()
+        for s in range(students):
+            student = Student(id=f"bench_student_{suffix}_{s}", email=f"bench_student_{suffix}_{s}@example.com",
+                              name=f"Student {s}", password="-")
+            record = StudentRecord(class_id=class_id, name=student.name, roll_no=str(s), email=student.email)
+            db.add_all([student, record])
+            await db.flush()
+            db.add(Enrollment(student_id=student.id, class_id=class_id, student_record_id=record.id,
+                              roll_no=str(s), status="active"))
+            tokens[record.id] = main.create_access_token({"sub": student.email, "role": "student"})
+
+        session = QRSession(class_id=class_id, teacher_id=teacher.id, secret=qr_codes.new_secret(),
+                            attendance_date=datetime.now().date(), rotation_interval=60)
+        db.add(session)
+        await db.commit()
+        return teacher.id, class_id, session, tokens
+
+async def cleanup(teacher_id: str, student_prefix: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Teacher).where(Teacher.id == teacher_id))
+        await db.execute(delete(Student).where(Student.id.startswith(student_prefix)))
+        await db.commit()
+
+async def stored_counts(session: QRSession, class_id: str):
+    async with AsyncSessionLocal() as db:
+        scans = await db.execute(select(func.count()).select_from(QRScan).where(QRScan.session_id == session.id))
+        marks = await db.execute(
+            select(func.count())
+            .select_from(AttendanceMark)
+            .join(StudentRecord, StudentRecord.id == AttendanceMark.student_record_id)
+            .where(StudentRecord.class_id == class_id)
+            .where(AttendanceMark.date == session.attendance_date)
+            .where(AttendanceMark.status == "P")
+        )
+        return scans.scalar(), marks.scalar()
+
+async def run(students: int, concurrency: int, orphans: int):
+    await init_db()
+    teacher_id, class_id, session, tokens = await create_fixture(students)
+    student_prefix = teacher_id.replace("bench_teacher_", "bench_student_")
+    if not orphans:
+        scan_ingestor.start()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def scan(token: str) -> bool:
+                async with semaphore:
+                    code = qr_codes.current_code(session.secret, session.rotation_interval)
+                    response = await client.post(
+                        "/qr/scan",
+                        params={"class_id": class_id, "qr_code": code},
+                        headers={"Authorization": f"Bearer {token}"}
+                    )
+                    return response.status_code == 200
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*(scan(token) for token in tokens.values()))
+            accepted_at = time.perf_counter()
+
+            if orphans:
+                doomed = list(tokens)[:orphans]
+                async with AsyncSessionLocal() as db:
+                    await db.execute(delete(StudentRecord).where(StudentRecord.id.in_(doomed)))
+                    await db.commit()
+            await scan_ingestor.stop()
+            finished = time.perf_counter()
+
+        accepted = sum(results)
+        scans, marks = await stored_counts(session, class_id)
+        expected = accepted - orphans
+        print(f"students={students} concurrency={concurrency} orphans={orphans}")
+        print(f"accepted {accepted}/{students} scans in {accepted_at - started:.2f}s "
+              f"({accepted / (accepted_at - started):.0f} scans/s)")
+        print(f"all flushed after {finished - started:.2f}s "
+              f"({accepted / (finished - started):.0f} scans/s end to end)")
+        print(f"stored qr_scans={scans} marks={marks} expected={expected} "
+              f"lost={max(0, expected - scans)}")
+        return scans == expected and marks == expected
+    finally:
+        await cleanup(teacher_id, student_prefix)
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--orphans", type=int, default=0)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.students, args.concurrency, args.orphans))
+    raise SystemExit(0 if ok else 1)
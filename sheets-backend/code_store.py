@@ -0,0 +1,177 @@
+"""Expiring key/value store for verification and password-reset codes.
+
+Entries live under a namespace ("verification", "password_reset") and key
+(the email) and disappear after their TTL: reads ignore expired entries and
+a background sweeper deletes them every CODE_STORE_SWEEP_INTERVAL seconds.
+
+CODE_STORE_BACKEND picks the backend:
+- "sql" (default) keeps codes in the pending_codes table, so every uvicorn
+  worker sees the same codes.
+- "memory" keeps them in this process; only for single-worker or local runs.
+
+Either way each namespace holds at most CODE_STORE_MAX_ENTRIES codes; setting
+one more evicts the oldest.
+"""
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from models import PendingCode
+from app_logging import get_logger
+
+logger = get_logger("code_store")
+
+CODE_STORE_BACKEND = os.getenv("CODE_STORE_BACKEND", "sql")
+CODE_STORE_MAX_ENTRIES = int(os.getenv("CODE_STORE_MAX_ENTRIES", "10000"))
+CODE_STORE_SWEEP_INTERVAL = float(os.getenv("CODE_STORE_SWEEP_INTERVAL", "60"))
+
+class CodeStore(ABC):
+    """Backend interface plus the shared sweeper task"""
+
+    def __init__(self, max_entries: int = CODE_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._task = None
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: dict, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, namespace: str, key: str):
+        ...
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Delete expired entries; returns how many were removed"""
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CODE_STORE_SWEEP_INTERVAL)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info("Swept %d expired codes", removed)
+            except Exception:
+                logger.exception("Code sweep failed")
+
+class MemoryCodeStore(CodeStore):
+    def __init__(self, max_entries: int = CODE_STORE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self._entries: Dict[str, "OrderedDict[str, Tuple[float, dict]]"] = {}
+
+    async def get(self, namespace: str, key: str) -> Optional[dict]:
+        entries = self._entries.get(namespace, {})
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del entries[key]
+            return None
+        return value
+
+    async def set(self, namespace: str, key: str, value: dict, ttl: float):
+        entries = self._entries.setdefault(namespace, OrderedDict())
+        entries.pop(key, None)
+        entries[key] = (time.monotonic() + ttl, value)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    async def delete(self, namespace: str, key: str):
+        self._entries.get(namespace, {}).pop(key, None)
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        removed = 0
+        for entries in self._entries.values():
+            expired = [key for key, (expires_at, _) in entries.items() if expires_at <= now]
+            for key in expired:
+                del entries[key]
+            removed += len(expired)
+        return removed
+
+class SQLCodeStore(CodeStore):
+    """Codes in the pending_codes table, one row per (namespace, key)"""
+
+    def __init__(self, session_factory=AsyncSessionLocal, max_entries: int = CODE_STORE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.session_factory = session_factory
+
+    async def get(self, namespace: str, key: str) -> Optional[dict]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(PendingCode.value)
+                .where(PendingCode.namespace == namespace)
+                .where(PendingCode.key == key)
+                .where(PendingCode.expires_at > datetime.utcnow())
+            )
+            return result.scalar_one_or_none()
+
+    async def set(self, namespace: str, key: str, value: dict, ttl: float):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        async with self.session_factory() as db:
+            await db.execute(
+                insert(PendingCode)
+                .values(namespace=namespace, key=key, value=value, expires_at=expires_at)
+                .on_conflict_do_update(
+                    index_elements=[PendingCode.namespace, PendingCode.key],
+                    set_={"value": value, "expires_at": expires_at}
+                )
+            )
+            # Codes in a namespace share a TTL, so the earliest to expire are the oldest
+            cutoff = (
+                select(PendingCode.expires_at)
+                .where(PendingCode.namespace == namespace)
+                .order_by(PendingCode.expires_at.desc())
+                .offset(self.max_entries - 1)
+                .limit(1)
+                .scalar_subquery()
+            )
+            await db.execute(
+                delete(PendingCode)
+                .where(PendingCode.namespace == namespace)
+                .where(PendingCode.expires_at < cutoff)
+            )
+            await db.commit()
+
+    async def delete(self, namespace: str, key: str):
+        async with self.session_factory() as db:
+            await db.execute(
+                delete(PendingCode)
+                .where(PendingCode.namespace == namespace)
+                .where(PendingCode.key == key)
+            )
+            await db.commit()
+
+    async def sweep(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(delete(PendingCode).where(PendingCode.expires_at <= datetime.utcnow()))
+            await db.commit()
+            return result.rowcount
+
+code_store: CodeStore = MemoryCodeStore() if CODE_STORE_BACKEND == "memory" else SQLCodeStore()
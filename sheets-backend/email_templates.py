@@ -0,0 +1,207 @@
+"""Email templates, compiled once at import.
+
+Each template is split into its literal chunks and placeholder slots up
+front, and its MIME skeleton (the multipart container with Subject and From,
+and the text/html part with its headers) is built once. A send joins the
+chunks around the escaped name and code, base64-encodes the result and
+fills it into copies of the skeleton, adding only the To header.
+render_messages builds many messages from one template for bulk sends such
+as re-sending codes; bench_email.py measures both against building each
+message from scratch.
+"""
+import copy
+import html
+from dataclasses import dataclass
+from email.charset import Charset
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from string import Formatter
+from email.message import Message
+from typing import Dict, Iterable, List, Tuple
+
+from mailer import FROM_EMAIL
+
+VERIFICATION_HTML = """\
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Email Verification</title>
+</head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #a8edea;">
+    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: linear-gradient(135deg, #a8edea 0%, #c2f5e9 100%); min-height: 100vh;">
+        <tr>
+            <td style="padding: 40px 20px;">
+                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 600px; margin: 0 auto; background: white; border-radius: 20px; box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1); overflow: hidden;">
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #16a085 0%, #2ecc71 100%); padding: 50px 40px; text-align: center;">
+                            <h1 style="margin: 0 0 8px 0; color: white; font-size: 28px; font-weight: 600;">Lernova Attendsheets</h1>
+                            <p style="margin: 0; color: white; font-size: 15px; opacity: 0.95;">Modern Attendance Management</p>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 40px;">
+                            <h2 style="margin: 0 0 20px 0; color: #2c3e50; font-size: 26px; font-weight: 600;">Welcome, {name}!</h2>
+                            <p style="margin: 0 0 30px 0; color: #7f8c8d; font-size: 15px; line-height: 1.6;">
+                                Thank you for signing up for Lernova Attendsheets. To complete your registration, please verify your email address.
+                            </p>
+                            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="margin-bottom: 25px; background: linear-gradient(135deg, #d4f1f4 0%, #c3f0d8 100%); border-radius: 16px;">
+                                <tr>
+                                    <td style="padding: 30px; text-align: center;">
+                                        <p style="margin: 0 0 15px 0; font-size: 11px; font-weight: 600; letter-spacing: 1.5px; color: #16a085; text-transform: uppercase;">Your Verification Code</p>
+                                        <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: white; border-radius: 12px; margin-bottom: 15px;">
+                                            <tr>
+                                                <td style="padding: 20px; text-align: center;">
+                                                    <span style="font-size: 42px; font-weight: 700; letter-spacing: 14px; color: #16a085; font-family: 'Courier New', monospace;">{code}</span>
+                                                </td>
+                                            </tr>
+                                        </table>
+                                        <p style="margin: 0; font-size: 13px; color: #16a085;">This code will expire in 15 minutes</p>
+                                    </td>
+                                </tr>
+                            </table>
+                            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: #f8f9fa; border-left: 4px solid #16a085; border-radius: 8px;">
+                                <tr>
+                                    <td style="padding: 15px 20px;">
+                                        <p style="margin: 0 0 5px 0; color: #2c3e50; font-size: 14px; font-weight: 600;">Security Tip</p>
+                                        <p style="margin: 0; color: #7f8c8d; font-size: 13px; line-height: 1.5;">If you didn't create an account with Lernova Attendsheets, you can safely ignore this email.</p>
+                                    </td>
+                                </tr>
+                            </table>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 30px 40px; text-align: center; border-top: 1px solid #ecf0f1;">
+                            <p style="margin: 0; color: #95a5a6; font-size: 12px;">© 2025 Lernova Attendsheets. All rights reserved.</p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+"""
+
+PASSWORD_RESET_HTML = """\
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Password Reset</title>
+</head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #a8edea;">
+    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: linear-gradient(135deg, #a8edea 0%, #c2f5e9 100%); min-height: 100vh;">
+        <tr>
+            <td style="padding: 40px 20px;">
+                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 600px; margin: 0 auto; background: white; border-radius: 20px; box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1); overflow: hidden;">
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #16a085 0%, #2ecc71 100%); padding: 50px 40px; text-align: center;">
+                            <h1 style="margin: 0 0 8px 0; color: white; font-size: 28px; font-weight: 600;">Password Reset</h1>
+                            <p style="margin: 0; color: white; font-size: 15px; opacity: 0.95;">Lernova Attendsheets</p>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 40px;">
+                            <h2 style="margin: 0 0 20px 0; color: #2c3e50; font-size: 26px; font-weight: 600;">Hi {name},</h2>
+                            <p style="margin: 0 0 30px 0; color: #7f8c8d; font-size: 15px; line-height: 1.6;">
+                                We received a request to reset your password. Use the verification code below to set a new password.
+                            </p>
+                            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="margin-bottom: 25px; background: linear-gradient(135deg, #d4f1f4 0%, #c3f0d8 100%); border-radius: 16px;">
+                                <tr>
+                                    <td style="padding: 30px; text-align: center;">
+                                        <p style="margin: 0 0 15px 0; font-size: 11px; font-weight: 600; letter-spacing: 1.5px; color: #16a085; text-transform: uppercase;">Your Password Reset Code</p>
+                                        <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: white; border-radius: 12px; margin-bottom: 15px;">
+                                            <tr>
+                                                <td style="padding: 20px; text-align: center;">
+                                                    <span style="font-size: 42px; font-weight: 700; letter-spacing: 14px; color: #16a085; font-family: 'Courier New', monospace;">{code}</span>
+                                                </td>
+                                            </tr>
+                                        </table>
+                                        <p style="margin: 0; font-size: 13px; color: #16a085;">This code will expire in 15 minutes</p>
+                                    </td>
+                                </tr>
+                            </table>
+                            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: #f8f9fa; border-left: 4px solid #e74c3c; border-radius: 8px;">
+                                <tr>
+                                    <td style="padding: 15px 20px;">
+                                        <p style="margin: 0 0 5px 0; color: #2c3e50; font-size: 14px; font-weight: 600;">Security Alert</p>
+                                        <p style="margin: 0; color: #7f8c8d; font-size: 13px; line-height: 1.5;">If you didn't request a password reset, please ignore this email or contact support if you have concerns about your account security.</p>
+                                    </td>
+                                </tr>
+                            </table>
+                        </td>
+                    </tr>
+                    <tr>
+                        <td style="padding: 30px 40px; text-align: center; border-top: 1px solid #ecf0f1;">
+                            <p style="margin: 0; color: #95a5a6; font-size: 12px;">© 2025 Lernova Attendsheets. All rights reserved.</p>
+                        </td>
+                    </tr>
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+"""
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    subject: str
+    chunks: Tuple[str, ...]
+    slots: Tuple[str, ...]
+
+    def render(self, **values: str) -> str:
+        """Fill the slots with HTML-escaped values"""
+        escaped = {key: html.escape(str(value)) for key, value in values.items()}
+        parts = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            parts.append(escaped[slot])
+            parts.append(chunk)
+        return "".join(parts)
+
+def compile_template(subject: str, source: str) -> CompiledTemplate:
+    chunks, slots = [""], []
+    for literal, field, _, _ in Formatter().parse(source):
+        chunks[-1] += literal
+        if field is not None:
+            slots.append(field)
+            chunks.append("")
+    return CompiledTemplate(subject, tuple(chunks), tuple(slots))
+
+TEMPLATES: Dict[str, CompiledTemplate] = {
+    "verification": compile_template("Verify Your Lernova Attendsheets Account", VERIFICATION_HTML),
+    "password_reset": compile_template("Reset Your Lernova Attendsheets Password", PASSWORD_RESET_HTML),
+}
+
+SENDER = f"Lernova Attendsheets <{FROM_EMAIL}>"
+UTF8 = Charset("utf-8")
+
+def _skeleton(subject: str) -> Tuple[MIMEMultipart, MIMEText]:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = SENDER
+    return msg, MIMEText("", "html", "utf-8")
+
+SKELETONS: Dict[str, Tuple[MIMEMultipart, MIMEText]] = {
+    name: _skeleton(compiled.subject) for name, compiled in TEMPLATES.items()
+}
+
+def _fill(skeleton: Message, payload) -> Message:
+    """Copy of a skeleton with its own header list and the given payload; the skeleton is never mutated"""
+    msg = copy.copy(skeleton)
+    msg._headers = list(skeleton._headers)
+    msg._payload = payload
+    return msg
+
+def render_message(template: str, to_email: str, name: str, code: str) -> MIMEMultipart:
+    container, html_part = SKELETONS[template]
+    body = UTF8.body_encode(TEMPLATES[template].render(name=name, code=code))
+    msg = _fill(container, [_fill(html_part, body)])
+    msg["To"] = to_email
+    return msg
+def render_messages(template: str, recipients: Iterable[Tuple[str, str, str]]) -> List[MIMEMultipart]:
+    """Messages for (to_email, name, code) tuples, all from one template"""
+    return [render_message(template, to_email, name, code) for to_email, name, code in recipients]
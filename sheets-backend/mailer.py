@@ -0,0 +1,185 @@
+"""Background mail delivery.
+
+Handlers queue a message with `mailer.enqueue` and return immediately. A
+background task delivers the queue over one persistent SMTP connection
+(opened lazily, reused across messages, reopened after errors), running the
+blocking smtplib calls in a thread so the event loop never waits on the mail
+server. Failed messages are retried with exponential backoff.
+
+MAIL_BACKEND=memory swaps SMTP for MemoryTransport, which keeps delivered
+messages in `mailer.transport.sent` instead of sending them; use it for
+tests and local development.
+"""
+import asyncio
+import os
+import smtplib
+import ssl
+import threading
+from dataclasses import dataclass
+from email.message import Message
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from app_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("mailer")
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# Implicit TLS (SMTP_SSL) by default; set to false for a plain local sink
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() in ("1", "true", "yes")
+FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_USERNAME)
+
+MAIL_BACKEND = os.getenv("MAIL_BACKEND", "smtp")
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "4"))
+MAIL_RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", "2"))
+# Close the idle SMTP connection after this many seconds without mail
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+
+@dataclass
+class OutgoingMail:
+    to_email: str
+    message: Message
+    attempts: int = 0
+
+class SMTPTransport:
+    """One reusable SMTP connection; every method blocks and runs in a worker thread"""
+
+    def __init__(self, server: str = SMTP_SERVER, port: int = SMTP_PORT, username: Optional[str] = SMTP_USERNAME,
+                 password: Optional[str] = SMTP_PASSWORD, use_ssl: bool = SMTP_USE_SSL):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self._conn = None
+        # A send cancelled on shutdown can still be running in its thread
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.username and self.password) or not self.use_ssl
+
+    def _connect(self):
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.server, self.port, context=ssl.create_default_context(), timeout=30)
+        else:
+            conn = smtplib.SMTP(self.server, self.port, timeout=30)
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def send(self, from_email: str, to_email: str, message: Message):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.sendmail(from_email, to_email, message.as_string())
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server dropped an idle connection; reconnect once before failing
+                self._close()
+                self._conn = self._connect()
+                self._conn.sendmail(from_email, to_email, message.as_string())
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
+class MemoryTransport:
+    """Stand-in SMTP sink that records messages instead of sending them"""
+
+    configured = True
+
+    def __init__(self):
+        self.sent: List[dict] = []
+
+    def send(self, from_email: str, to_email: str, message: Message):
+        self.sent.append({"from": from_email, "to": to_email, "subject": message["Subject"], "message": message})
+
+    def close(self):
+        pass
+
+class Mailer:
+    def __init__(self, transport=None, from_email: Optional[str] = FROM_EMAIL,
+                 max_attempts: int = MAIL_MAX_ATTEMPTS, retry_delay: float = MAIL_RETRY_DELAY):
+        if transport is None:
+            transport = MemoryTransport() if MAIL_BACKEND == "memory" else SMTPTransport()
+        self.transport = transport
+        self.from_email = from_email
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    @property
+    def configured(self) -> bool:
+        return self.transport.configured
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, to_email: str, message: Message) -> bool:
+        """Queue a message for delivery; False if mail is not configured and nothing will be sent"""
+        if not self.configured:
+            return False
+        self._queue.put_nowait(OutgoingMail(to_email, message))
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task after delivering what is already queued (one attempt each)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            mail = self._queue.get_nowait()
+            try:
+                await self._deliver(mail)
+            except Exception as e:
+                logger.error("Dropping mail on shutdown: %s", e, extra={"to": mail.to_email})
+        await asyncio.to_thread(self.transport.close)
+
+    async def _run(self):
+        while True:
+            try:
+                mail = await asyncio.wait_for(self._queue.get(), timeout=MAIL_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(self.transport.close)
+                continue
+
+            try:
+                await self._deliver(mail)
+                logger.info("Email sent", extra={"to": mail.to_email})
+            except Exception as e:
+                mail.attempts += 1
+                if mail.attempts >= self.max_attempts:
+                    logger.error("Giving up on mail after %d attempts: %s", mail.attempts, e, extra={"to": mail.to_email})
+                    continue
+                delay = self.retry_delay * 2 ** (mail.attempts - 1)
+                logger.warning("Mail failed (%s), retrying in %.0fs", e, delay, extra={"to": mail.to_email})
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, mail)
+
+    async def _deliver(self, mail: OutgoingMail):
+        await asyncio.to_thread(self.transport.send, self.from_email, mail.to_email, mail.message)
+
+mailer = Mailer()
@@ -1,48 +1,48 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
-import jwt
-import hashlib
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from datetime import datetime, timedelta, date
 import random
 import string
 from dotenv import load_dotenv
-import ssl
-import os
+import asyncio
+import logging
 
-from database import get_db, init_db
+from database import get_db, release_db, init_db, AsyncSessionLocal, pool_stats
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, func, and_, or_
 from sqlalchemy.orm import selectinload
 from models import Teacher, Student, Class, Enrollment, StudentRecord, QRSession, ContactMessage
+from attendance_marks import VALID_STATUSES, DateWindow, month_window, parse_mark_date, load_attendance, count_marks, mark_rows, upsert_marks, delete_marks, sync_attendance, bump_sheet_version
+from attendance_stats import class_thresholds, class_statistics, student_statistics, mark_totals
+from overview import adjust_teacher_overview, release_student_enrollments
+from auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, verify_token
+from principals import invalidate_principal, Identity, lookup_identities, lookup_identity
+import qr_events
+import qr_codes
+from scan_ingest import scan_ingestor, PendingScan, load_scanned, count_scanned, mark_unscanned_absent
+from mailer import mailer
+from email_templates import render_message
+from code_store import code_store
+from passwords import hash_password, verify_password, needs_rehash
+from request_metrics import metrics_middleware, route_metrics, reset_route_metrics
+from app_logging import configure_logging, stop_logging, get_logger
+from attendance import router as attendance_router
+from sheet_store import sheet_store
+from snapshot import snapshot_cache
 
 load_dotenv()
 
-app = FastAPI(title="Lernova Attendsheets API")
-
-# Security
-security = HTTPBearer()
-
-# Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+configure_logging()
+logger = get_logger("main")
 
-# Email Configuration
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_USERNAME)
+app = FastAPI(title="Lernova Attendsheets API")
 
-# Temporary storage for verification codes
-verification_codes = {}
-password_reset_codes = {}
+# Verification / password-reset codes live in code_store (namespace, email)
+VERIFICATION_CODE_TTL = 15 * 60
+RESET_CODE_TTL = 10 * 60
 
 # CORS Configuration
 app.add_middleware(
@@ -57,6 +57,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# Statement count / DB time / pool wait per request (request_metrics.py)
+app.middleware("http")(metrics_middleware)
+
 # ==================== PYDANTIC MODELS ====================
 
 class SignupRequest(BaseModel):
@@ -110,6 +114,15 @@ class ClassRequest(BaseModel):
     customColumns: List[Dict[str, Any]]
     thresholds: Optional[Dict[str, Any]] = None
 
+class AttendanceChange(BaseModel):
+    student_id: int
+    date: str
+    status: Optional[str] = None  # None or "" clears the cell
+
+class AttendancePatchRequest(BaseModel):
+    changes: List[AttendanceChange]
+    base_version: Optional[int] = None
+
 class ContactRequest(BaseModel):
     name: str
     email: EmailStr
@@ -150,20 +163,31 @@ async def debug_create_tables():
     """TEMPORARY: Manually create database tables"""
     try:
         from database import Base, engine
-        from models import Teacher, Student, Class, Enrollment, StudentRecord, QRSession, ContactMessage
+        from models import Teacher, Student, Class, Enrollment, StudentRecord, AttendanceMark, QRSession, ContactMessage
         
-        print("🔧 Creating database tables...")
+        logger.info("Creating database tables")
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
         
-        print("✅ Tables created successfully!")
+        logger.info("Tables created")
         return {"success": True, "message": "Tables created successfully!"}
     except Exception as e:
-        print(f"❌ Error creating tables: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating tables")
         return {"success": False, "error": str(e)}
 
+@app.get("/debug/pool-stats")
+async def debug_pool_stats():
+    """Connection pool occupancy and checkout wait times for this worker"""
+    return pool_stats()
+
+@app.get("/debug/request-metrics")
+async def debug_request_metrics(reset: bool = False):
+    """Per-route statement counts and timings for this worker"""
+    metrics = route_metrics()
+    if reset:
+        reset_route_metrics()
+    return metrics
+
 @app.get("/debug/view-teachers")
 async def view_teachers(db: AsyncSession = Depends(get_db)):
     """View all teachers in database"""
@@ -246,6 +270,8 @@ async def view_class_details(class_id: str, db: AsyncSession = Depends(get_db)):
     if not cls:
         return {"error": "Class not found"}
     
+    attendance_map = await load_attendance(db, [s.id for s in cls.student_records])
+    
     return {
         "class_id": cls.id,
         "name": cls.name,
@@ -260,7 +286,7 @@ async def view_class_details(class_id: str, db: AsyncSession = Depends(get_db)):
                 "name": s.name,
                 "roll_no": s.roll_no,
                 "email": s.email,
-                "attendance": s.attendance  # Full attendance JSON
+                "attendance": attendance_map[s.id]  # Full attendance history
             }
             for s in cls.student_records
         ]
@@ -296,6 +322,7 @@ async def view_student_records(db: AsyncSession = Depends(get_db)):
     """View all student records (the actual student data in classes)"""
     result = await db.execute(select(StudentRecord))
     records = result.scalars().all()
+    attendance_map = await load_attendance(db, [sr.id for sr in records])
     
     return {
         "count": len(records),
@@ -306,8 +333,8 @@ async def view_student_records(db: AsyncSession = Depends(get_db)):
                 "name": sr.name,
                 "roll_no": sr.roll_no,
                 "email": sr.email,
-                "attendance": sr.attendance,
-                "total_days": len(sr.attendance) if sr.attendance else 0
+                "attendance": attendance_map[sr.id],
+                "total_days": len(attendance_map[sr.id])
             }
             for sr in records
         ]
@@ -318,6 +345,7 @@ async def view_qr_sessions(db: AsyncSession = Depends(get_db)):
     """View all QR code sessions"""
     result = await db.execute(select(QRSession))
     sessions = result.scalars().all()
+    scanned = await load_scanned(db, [qs.id for qs in sessions])
     
     return {
         "count": len(sessions),
@@ -326,12 +354,12 @@ async def view_qr_sessions(db: AsyncSession = Depends(get_db)):
                 "id": qs.id,
                 "class_id": qs.class_id,
                 "teacher_id": qs.teacher_id,
-                "current_code": qs.current_code,
-                "attendance_date": qs.attendance_date,
+                "current_code": qr_codes.current_code(qs.secret, qs.rotation_interval),
+                "attendance_date": qs.attendance_date.isoformat(),
                 "status": qs.status,
                 "rotation_interval": qs.rotation_interval,
-                "scanned_students": qs.scanned_students,
-                "scanned_count": len(qs.scanned_students) if qs.scanned_students else 0,
+                "scanned_students": scanned[qs.id],
+                "scanned_count": len(scanned[qs.id]),
                 "started_at": qs.started_at.isoformat() if qs.started_at else None,
                 "stopped_at": qs.stopped_at.isoformat() if qs.stopped_at else None,
                 "code_generated_at": qs.code_generated_at.isoformat() if qs.code_generated_at else None
@@ -391,291 +419,130 @@ async def database_summary(db: AsyncSession = Depends(get_db)):
 @app.get("/debug/search-by-email/{email}")
 async def search_by_email(email: str, db: AsyncSession = Depends(get_db)):
     """Search for a user (teacher or student) by email"""
-    
-    # Search teachers
-    teacher_result = await db.execute(select(Teacher).where(Teacher.email == email))
-    teacher = teacher_result.scalar_one_or_none()
-    
-    # Search students
-    student_result = await db.execute(select(Student).where(Student.email == email))
-    student = student_result.scalar_one_or_none()
+    identity = await lookup_identity(db, email)
     
     response = {"email": email, "found": False}
     
-    if teacher:
-        response["found"] = True
-        response["type"] = "teacher"
-        response["data"] = {
-            "id": teacher.id,
-            "name": teacher.name,
-            "email": teacher.email,
-            "verified": teacher.verified,
-            "total_classes": teacher.total_classes,
-            "total_students": teacher.total_students,
-            "created_at": teacher.created_at.isoformat() if teacher.created_at else None
-        }
-    elif student:
+    if identity:
         response["found"] = True
-        response["type"] = "student"
+        response["type"] = identity.role
         response["data"] = {
-            "id": student.id,
-            "name": student.name,
-            "email": student.email,
-            "verified": student.verified,
-            "created_at": student.created_at.isoformat() if student.created_at else None
+            "id": identity.id,
+            "name": identity.name,
+            "email": identity.email,
+            "verified": identity.verified,
+            "created_at": identity.created_at.isoformat() if identity.created_at else None
         }
+        if identity.role == "teacher":
+            response["data"]["total_classes"] = identity.total_classes
+            response["data"]["total_students"] = identity.total_students
     
     return response
 
 # ==================== HELPER FUNCTIONS ====================
 
-def get_password_hash(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return get_password_hash(plain_password) == hashed_password
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+async def check_password(db: AsyncSession, identity: Identity, password: str) -> bool:
+    """Verify a login password off the event loop, upgrading outdated hashes on success"""
+    # Hashing is slow; don't hold a pooled connection while it runs
+    await release_db(db)
+    if not await verify_password(password, identity.password):
+        return False
+    if needs_rehash(identity.password):
+        model = identity.model
+        await db.execute(
+            update(model).where(model.id == identity.id).values(password=await hash_password(password))
+        )
+        await db.commit()
+    return True
 
 def generate_verification_code() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
 def send_verification_email(to_email: str, code: str, name: str):
     try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = "Verify Your Lernova Attendsheets Account"
-        msg['From'] = f"Lernova Attendsheets <{FROM_EMAIL}>"
-        msg['To'] = to_email
-
-        html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Email Verification</title>
-        </head>
-        <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #a8edea;">
-            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: linear-gradient(135deg, #a8edea 0%, #c2f5e9 100%); min-height: 100vh;">
-                <tr>
-                    <td style="padding: 40px 20px;">
-                        <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 600px; margin: 0 auto; background: white; border-radius: 20px; box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1); overflow: hidden;">
-                            <tr>
-                                <td style="background: linear-gradient(135deg, #16a085 0%, #2ecc71 100%); padding: 50px 40px; text-align: center;">
-                                    <h1 style="margin: 0 0 8px 0; color: white; font-size: 28px; font-weight: 600;">Lernova Attendsheets</h1>
-                                    <p style="margin: 0; color: white; font-size: 15px; opacity: 0.95;">Modern Attendance Management</p>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 40px;">
-                                    <h2 style="margin: 0 0 20px 0; color: #2c3e50; font-size: 26px; font-weight: 600;">Welcome, {name}!</h2>
-                                    <p style="margin: 0 0 30px 0; color: #7f8c8d; font-size: 15px; line-height: 1.6;">
-                                        Thank you for signing up for Lernova Attendsheets. To complete your registration, please verify your email address.
-                                    </p>
-                                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="margin-bottom: 25px; background: linear-gradient(135deg, #d4f1f4 0%, #c3f0d8 100%); border-radius: 16px;">
-                                        <tr>
-                                            <td style="padding: 30px; text-align: center;">
-                                                <p style="margin: 0 0 15px 0; font-size: 11px; font-weight: 600; letter-spacing: 1.5px; color: #16a085; text-transform: uppercase;">Your Verification Code</p>
-                                                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: white; border-radius: 12px; margin-bottom: 15px;">
-                                                    <tr>
-                                                        <td style="padding: 20px; text-align: center;">
-                                                            <span style="font-size: 42px; font-weight: 700; letter-spacing: 14px; color: #16a085; font-family: 'Courier New', monospace;">{code}</span>
-                                                        </td>
-                                                    </tr>
-                                                </table>
-                                                <p style="margin: 0; font-size: 13px; color: #16a085;">This code will expire in 15 minutes</p>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: #f8f9fa; border-left: 4px solid #16a085; border-radius: 8px;">
-                                        <tr>
-                                            <td style="padding: 15px 20px;">
-                                                <p style="margin: 0 0 5px 0; color: #2c3e50; font-size: 14px; font-weight: 600;">Security Tip</p>
-                                                <p style="margin: 0; color: #7f8c8d; font-size: 13px; line-height: 1.5;">If you didn't create an account with Lernova Attendsheets, you can safely ignore this email.</p>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 30px 40px; text-align: center; border-top: 1px solid #ecf0f1;">
-                                    <p style="margin: 0; color: #95a5a6; font-size: 12px;">© 2025 Lernova Attendsheets. All rights reserved.</p>
-                                </td>
-                            </tr>
-                        </table>
-                    </td>
-                </tr>
-            </table>
-        </body>
-        </html>
-        """
-        
-        part = MIMEText(html, 'html')
-        msg.attach(part)
-
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context) as server:
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.sendmail(FROM_EMAIL, to_email, msg.as_string())
-        
-        print(f"Email sent to {to_email}")
-        return True
+        return mailer.enqueue(to_email, render_message("verification", to_email, name, code))
     except Exception as e:
-        print(f"Error sending email: {e}")
+        logger.exception("Error queueing verification email")
         return False
 
 def send_password_reset_email(to_email: str, code: str, name: str):
     try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = "Reset Your Lernova Attendsheets Password"
-        msg['From'] = f"Lernova Attendsheets <{FROM_EMAIL}>"
-        msg['To'] = to_email
-
-        html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Password Reset</title>
-        </head>
-        <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #a8edea;">
-            <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: linear-gradient(135deg, #a8edea 0%, #c2f5e9 100%); min-height: 100vh;">
-                <tr>
-                    <td style="padding: 40px 20px;">
-                        <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 600px; margin: 0 auto; background: white; border-radius: 20px; box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1); overflow: hidden;">
-                            <tr>
-                                <td style="background: linear-gradient(135deg, #16a085 0%, #2ecc71 100%); padding: 50px 40px; text-align: center;">
-                                    <h1 style="margin: 0 0 8px 0; color: white; font-size: 28px; font-weight: 600;">Password Reset</h1>
-                                    <p style="margin: 0; color: white; font-size: 15px; opacity: 0.95;">Lernova Attendsheets</p>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 40px;">
-                                    <h2 style="margin: 0 0 20px 0; color: #2c3e50; font-size: 26px; font-weight: 600;">Hi {name},</h2>
-                                    <p style="margin: 0 0 30px 0; color: #7f8c8d; font-size: 15px; line-height: 1.6;">
-                                        We received a request to reset your password. Use the verification code below to set a new password.
-                                    </p>
-                                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="margin-bottom: 25px; background: linear-gradient(135deg, #d4f1f4 0%, #c3f0d8 100%); border-radius: 16px;">
-                                        <tr>
-                                            <td style="padding: 30px; text-align: center;">
-                                                <p style="margin: 0 0 15px 0; font-size: 11px; font-weight: 600; letter-spacing: 1.5px; color: #16a085; text-transform: uppercase;">Your Password Reset Code</p>
-                                                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: white; border-radius: 12px; margin-bottom: 15px;">
-                                                    <tr>
-                                                        <td style="padding: 20px; text-align: center;">
-                                                            <span style="font-size: 42px; font-weight: 700; letter-spacing: 14px; color: #16a085; font-family: 'Courier New', monospace;">{code}</span>
-                                                        </td>
-                                                    </tr>
-                                                </table>
-                                                <p style="margin: 0; font-size: 13px; color: #16a085;">This code will expire in 15 minutes</p>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background: #f8f9fa; border-left: 4px solid #e74c3c; border-radius: 8px;">
-                                        <tr>
-                                            <td style="padding: 15px 20px;">
-                                                <p style="margin: 0 0 5px 0; color: #2c3e50; font-size: 14px; font-weight: 600;">Security Alert</p>
-                                                <p style="margin: 0; color: #7f8c8d; font-size: 13px; line-height: 1.5;">If you didn't request a password reset, please ignore this email or contact support if you have concerns about your account security.</p>
-                                            </td>
-                                        </tr>
-                                    </table>
-                                </td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 30px 40px; text-align: center; border-top: 1px solid #ecf0f1;">
-                                    <p style="margin: 0; color: #95a5a6; font-size: 12px;">© 2025 Lernova Attendsheets. All rights reserved.</p>
-                                </td>
-                            </tr>
-                        </table>
-                    </td>
-                </tr>
-            </table>
-        </body>
-        </html>
-        """
-        
-        part = MIMEText(html, 'html')
-        msg.attach(part)
-
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context) as server:
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.sendmail(FROM_EMAIL, to_email, msg.as_string())
-        
-        return True
+        return mailer.enqueue(to_email, render_message("password_reset", to_email, name, code))
     except Exception as e:
-        print(f"Error sending reset email: {e}")
+        logger.exception("Error queueing password reset email")
         return False
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
-    """Verify JWT token and return user email and role"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        role: str = payload.get("role")
-        
-        if email is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
-        
-        return {"email": email, "role": role}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
-
-async def update_teacher_overview(teacher_id: str, db: AsyncSession):
-    """Update teacher's overview statistics"""
-    result = await db.execute(
-        select(Class).where(Class.teacher_id == teacher_id)
-    )
-    classes = result.scalars().all()
-    
-    total_students = 0
-    for cls in classes:
-        enrollment_result = await db.execute(
-            select(func.count(Enrollment.id))
-            .where(Enrollment.class_id == cls.id)
-            .where(Enrollment.status == "active")
-        )
-        total_students += enrollment_result.scalar()
-    
-    await db.execute(
-        update(Teacher)
-        .where(Teacher.id == teacher_id)
-        .values(total_classes=len(classes), total_students=total_students)
-    )
-    await db.commit()
+def student_payload(sr: StudentRecord, attendance: Dict[str, str], totals: Optional[Dict[int, dict]] = None) -> dict:
+    """A student row of a class sheet; `totals` is added for windowed reads"""
+    payload = {
+        "id": sr.id,
+        "name": sr.name,
+        "rollNo": sr.roll_no,
+        "email": sr.email,
+        "attendance": attendance
+    }
+    if totals is not None:
+        payload["totals"] = totals[sr.id]
+    return payload
+
+def attendance_window(month: Optional[int], year: Optional[int], from_date: Optional[date], to_date: Optional[date]) -> Optional[DateWindow]:
+    """Validate ?month=&year= or ?from=&to= query params into a date window (None = full history)"""
+    if month is not None or year is not None:
+        if from_date or to_date:
+            raise HTTPException(status_code=400, detail="Use either month/year or from/to, not both")
+        if month is None or year is None:
+            raise HTTPException(status_code=400, detail="month and year must be given together")
+        return month_window(year, month)
+    if from_date or to_date:
+        window = (from_date or date.min, to_date or date.max)
+        if window[0] > window[1]:
+            raise HTTPException(status_code=400, detail="from must not be after to")
+        return window
+    return None
+
+def qr_session_payload(session: QRSession, scanned: Optional[List[int]] = None, scanned_count: int = 0) -> dict:
+    """Session state for clients; pass `scanned` to include the full id list, or just a count"""
+    payload = {
+        "class_id": session.class_id,
+        "current_code": qr_codes.current_code(session.secret, session.rotation_interval),
+        "expires_in": round(qr_codes.seconds_until_rotation(session.rotation_interval), 3),
+        "attendance_date": session.attendance_date.isoformat(),
+        "started_at": session.started_at.isoformat(),
+        "rotation_interval": session.rotation_interval,
+        "scanned_count": len(scanned) if scanned is not None else scanned_count,
+        "status": session.status
+    }
+    if scanned is not None:
+        payload["scanned_students"] = scanned
+    return payload
 
 # ==================== STARTUP EVENT ====================
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables on startup"""
-    print("=" * 60)
-    print("🚀 LERNOVA BACKEND STARTING")
-    print("=" * 60)
+    logger.info("Lernova backend starting")
     
     # Import models to register them with Base
     from models import Teacher, Student, Class, Enrollment, StudentRecord, QRSession, ContactMessage
     
     try:
         await init_db()
-        print("✅ Database tables created/verified!")
+        logger.info("Database tables created/verified")
     except Exception as e:
-        print(f"❌ Database initialization error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Database initialization error")
     
-    print("=" * 60)
+    scan_ingestor.start()
+    mailer.start()
+    code_store.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write buffered QR scans, queued mail and queued log records before the worker exits"""
+    await scan_ingestor.stop()
+    await mailer.stop()
+    await code_store.stop()
+    stop_logging()
         
 # ==================== ROOT & HEALTH ====================
 
@@ -709,27 +576,26 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     """Sign up a new teacher"""
     try:
         # Check if user already exists
-        result = await db.execute(select(Teacher).where(Teacher.email == request.email))
-        existing_user = result.scalar_one_or_none()
-        
-        if existing_user:
+        if await lookup_identity(db, request.email, "teacher"):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email already exists")
         
         if len(request.password) < 8:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password must be at least 8 characters long")
         
+        await release_db(db)
+        password_hash = await hash_password(request.password)
+        
         # Generate verification code
         code = generate_verification_code()
-        print(f"Verification code for {request.email}: {code}")
+        logger.debug("Verification code issued", extra={"email": request.email, "code": code})
         
         # Store verification data
-        verification_codes[request.email] = {
+        await code_store.set("verification", request.email, {
             "code": code,
             "name": request.name,
-            "password": get_password_hash(request.password),
-            "role": "teacher",
-            "expires_at": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
-        }
+            "password": password_hash,
+            "role": "teacher"
+        }, VERIFICATION_CODE_TTL)
         
         # Send verification email
         email_sent = send_verification_email(request.email, code, request.name)
@@ -741,23 +607,17 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Signup error: {e}")
+        logger.exception("Signup error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Signup failed: {str(e)}")
 
 @app.post("/auth/verify-email", response_model=TokenResponse)
 async def verify_email(request: VerifyEmailRequest, db: AsyncSession = Depends(get_db)):
     """Verify email with code - handles both teacher and student"""
     try:
-        if request.email not in verification_codes:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No verification code found")
-        
-        stored_data = verification_codes[request.email]
-        
-        # Check expiration
-        expires_at = datetime.fromisoformat(stored_data["expires_at"])
-        if datetime.utcnow() > expires_at:
-            del verification_codes[request.email]
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification code expired")
+        # Expired codes are never returned by the store
+        stored_data = await code_store.get("verification", request.email)
+        if stored_data is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No verification code found or code expired")
         
         # Verify code
         if stored_data["code"] != request.code:
@@ -794,7 +654,7 @@ async def verify_email(request: VerifyEmailRequest, db: AsyncSession = Depends(g
             user_data = {"id": new_teacher.id, "email": new_teacher.email, "name": new_teacher.name}
         
         # Clean up verification code
-        del verification_codes[request.email]
+        await code_store.delete("verification", request.email)
         
         # Create access token
         access_token = create_access_token(
@@ -809,39 +669,23 @@ async def verify_email(request: VerifyEmailRequest, db: AsyncSession = Depends(g
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Verification error: {e}")
+        logger.exception("Verification error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Verification failed: {str(e)}")
 
 @app.post("/auth/login", response_model=TokenResponse)
 async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login user (teacher or student)"""
-    # Try teacher first
-    result = await db.execute(select(Teacher).where(Teacher.email == request.email))
-    teacher = result.scalar_one_or_none()
-    
-    if teacher and verify_password(request.password, teacher.password):
-        access_token = create_access_token(
-            data={"sub": request.email, "role": "teacher"},
-            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        )
-        return TokenResponse(
-            access_token=access_token,
-            user=UserResponse(id=teacher.id, email=teacher.email, name=teacher.name)
-        )
-    
-    # Try student
-    result = await db.execute(select(Student).where(Student.email == request.email))
-    student = result.scalar_one_or_none()
-    
-    if student and verify_password(request.password, student.password):
-        access_token = create_access_token(
-            data={"sub": request.email, "role": "student"},
-            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        )
-        return TokenResponse(
-            access_token=access_token,
-            user=UserResponse(id=student.id, email=student.email, name=student.name)
-        )
+    # Teacher account first, then student, from a single lookup
+    for identity in await lookup_identities(db, request.email):
+        if await check_password(db, identity, request.password):
+            access_token = create_access_token(
+                data={"sub": request.email, "role": identity.role},
+                expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            )
+            return TokenResponse(
+                access_token=access_token,
+                user=UserResponse(id=identity.id, email=identity.email, name=identity.name)
+            )
     
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
 
@@ -851,22 +695,9 @@ async def logout(auth_data: dict = Depends(verify_token)):
     return {"success": True, "message": "Logged out successfully"}
 
 @app.get("/auth/me", response_model=UserResponse)
-async def get_current_user(auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+async def get_current_user(auth_data: dict = Depends(verify_token)):
     """Get current user info"""
-    email = auth_data["email"]
-    role = auth_data["role"]
-    
-    if role == "teacher":
-        result = await db.execute(select(Teacher).where(Teacher.email == email))
-        user = result.scalar_one_or_none()
-    else:
-        result = await db.execute(select(Student).where(Student.email == email))
-        user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    return UserResponse(id=user.id, email=user.email, name=user.name)
+    return UserResponse(id=auth_data["id"], email=auth_data["email"], name=auth_data["name"])
 
 @app.put("/auth/profile")
 async def update_profile(request: UpdateProfileRequest, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
@@ -889,6 +720,7 @@ async def update_profile(request: UpdateProfileRequest, auth_data: dict = Depend
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     await db.commit()
+    invalidate_principal(email, role)
     return UserResponse(id=user.id, email=user.email, name=user.name)
 
 @app.delete("/auth/delete-account")
@@ -903,50 +735,37 @@ async def delete_account(auth_data: dict = Depends(verify_token), db: AsyncSessi
             user = result.scalar_one_or_none()
             if user:
                 await db.delete(user)
+            affected_teachers = [auth_data["id"]]
         else:
             result = await db.execute(select(Student).where(Student.email == email))
             user = result.scalar_one_or_none()
             if user:
+                affected_teachers = await release_student_enrollments(db, user.id)
                 await db.delete(user)
         
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
         
         await db.commit()
+        invalidate_principal(email, role)
+        for teacher_id in affected_teachers:
+            snapshot_cache.invalidate(teacher_id=teacher_id)
         return {"success": True, "message": "Account deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Delete account error: {e}")
+        logger.exception("Delete account error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete account")
 
 @app.post("/auth/request-password-reset")
 async def request_password_reset(request: PasswordResetRequest, db: AsyncSession = Depends(get_db)):
     """Request password reset"""
-    # Try teacher
-    result = await db.execute(select(Teacher).where(Teacher.email == request.email))
-    teacher = result.scalar_one_or_none()
+    identity = await lookup_identity(db, request.email)
     
-    if teacher:
+    if identity:
         code = generate_verification_code()
-        password_reset_codes[request.email] = {
-            "code": code,
-            "expires": datetime.utcnow() + timedelta(minutes=10)
-        }
-        send_password_reset_email(request.email, code, teacher.name)
-        return {"message": "Password reset code sent to your email"}
-    
-    # Try student
-    result = await db.execute(select(Student).where(Student.email == request.email))
-    student = result.scalar_one_or_none()
-    
-    if student:
-        code = generate_verification_code()
-        password_reset_codes[request.email] = {
-            "code": code,
-            "expires": datetime.utcnow() + timedelta(minutes=10)
-        }
-        send_password_reset_email(request.email, code, student.name)
+        await code_store.set("password_reset", request.email, {"code": code}, RESET_CODE_TTL)
+        send_password_reset_email(request.email, code, identity.name)
         return {"message": "Password reset code sent to your email"}
     
     return {"message": "If the email exists, a reset code has been sent"}
@@ -954,41 +773,25 @@ async def request_password_reset(request: PasswordResetRequest, db: AsyncSession
 @app.post("/auth/verify-reset-code")
 async def verify_reset_code(request: VerifyResetCodeRequest, db: AsyncSession = Depends(get_db)):
     """Verify reset code and change password"""
-    if request.email not in password_reset_codes:
+    stored_data = await code_store.get("password_reset", request.email)
+    if stored_data is None:
         raise HTTPException(status_code=400, detail="Invalid or expired code")
     
-    stored_data = password_reset_codes[request.email]
-    
     if stored_data["code"] != request.code:
         raise HTTPException(status_code=400, detail="Invalid code")
     
-    if datetime.utcnow() > stored_data["expires"]:
-        del password_reset_codes[request.email]
-        raise HTTPException(status_code=400, detail="Code has expired")
-    
-    new_password_hash = get_password_hash(request.new_password)
-    
-    # Try teacher
-    result = await db.execute(select(Teacher).where(Teacher.email == request.email))
-    teacher = result.scalar_one_or_none()
-    
-    if teacher:
-        teacher.password = new_password_hash
-        await db.commit()
-        del password_reset_codes[request.email]
-        return {"message": "Password updated successfully"}
-    
-    # Try student
-    result = await db.execute(select(Student).where(Student.email == request.email))
-    student = result.scalar_one_or_none()
+    identity = await lookup_identity(db, request.email)
+    if not identity:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    if student:
-        student.password = new_password_hash
-        await db.commit()
-        del password_reset_codes[request.email]
-        return {"message": "Password updated successfully"}
+    await release_db(db)
+    new_password_hash = await hash_password(request.new_password)
     
-    raise HTTPException(status_code=404, detail="User not found")
+    model = identity.model
+    await db.execute(update(model).where(model.id == identity.id).values(password=new_password_hash))
+    await db.commit()
+    await code_store.delete("password_reset", request.email)
+    return {"message": "Password updated successfully"}
 
 # ==================== STUDENT AUTH ENDPOINTS ====================
 
@@ -996,33 +799,30 @@ async def verify_reset_code(request: VerifyResetCodeRequest, db: AsyncSession =
 async def student_signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     """Sign up a new student"""
     try:
-        # Check if student already exists
-        result = await db.execute(select(Student).where(Student.email == request.email))
-        existing_student = result.scalar_one_or_none()
+        # Check both account types to prevent email conflicts
+        existing_roles = {identity.role for identity in await lookup_identities(db, request.email)}
         
-        if existing_student:
+        if "student" in existing_roles:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Student with this email already exists")
         
-        # Also check teachers to prevent email conflicts
-        result = await db.execute(select(Teacher).where(Teacher.email == request.email))
-        existing_teacher = result.scalar_one_or_none()
-        
-        if existing_teacher:
+        if "teacher" in existing_roles:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This email is already registered as a teacher")
         
         if len(request.password) < 8:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password must be at least 8 characters long")
         
+        await release_db(db)
+        password_hash = await hash_password(request.password)
+        
         code = generate_verification_code()
-        print(f"Verification code for {request.email}: {code}")
+        logger.debug("Verification code issued", extra={"email": request.email, "code": code})
         
-        verification_codes[request.email] = {
+        await code_store.set("verification", request.email, {
             "code": code,
             "name": request.name,
-            "password": get_password_hash(request.password),
-            "role": "student",
-            "expires_at": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
-        }
+            "password": password_hash,
+            "role": "student"
+        }, VERIFICATION_CODE_TTL)
         
         email_sent = send_verification_email(request.email, code, request.name)
         
@@ -1033,26 +833,20 @@ async def student_signup(request: SignupRequest, db: AsyncSession = Depends(get_
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Student signup error: {e}")
+        logger.exception("Student signup error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Signup failed: {str(e)}")
 
 @app.post("/auth/student/verify-email", response_model=TokenResponse)
 async def verify_student_email(request: VerifyEmailRequest, db: AsyncSession = Depends(get_db)):
     """Verify student email with code"""
     try:
-        if request.email not in verification_codes:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No verification code found")
-        
-        stored_data = verification_codes[request.email]
+        stored_data = await code_store.get("verification", request.email)
+        if stored_data is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No verification code found or code expired")
         
         if stored_data.get("role") != "student":
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid verification attempt")
         
-        expires_at = datetime.fromisoformat(stored_data["expires_at"])
-        if datetime.utcnow() > expires_at:
-            del verification_codes[request.email]
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification code expired")
-        
         if stored_data["code"] != request.code:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid verification code")
         
@@ -1068,7 +862,7 @@ async def verify_student_email(request: VerifyEmailRequest, db: AsyncSession = D
         await db.commit()
         await db.refresh(new_student)
         
-        del verification_codes[request.email]
+        await code_store.delete("verification", request.email)
         
         access_token = create_access_token(
             data={"sub": request.email, "role": "student"},
@@ -1082,19 +876,18 @@ async def verify_student_email(request: VerifyEmailRequest, db: AsyncSession = D
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Student verification error: {e}")
+        logger.exception("Student verification error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Verification failed: {str(e)}")
 
 @app.post("/auth/student/login", response_model=TokenResponse)
 async def student_login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login student"""
-    result = await db.execute(select(Student).where(Student.email == request.email))
-    user = result.scalar_one_or_none()
+    user = await lookup_identity(db, request.email, "student")
     
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
     
-    if not verify_password(request.password, user.password):
+    if not await check_password(db, user, request.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
     
     access_token = create_access_token(
@@ -1111,7 +904,7 @@ async def student_login(request: LoginRequest, db: AsyncSession = Depends(get_db
 async def delete_student_account(auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Delete student account and all associated data"""
     try:
-        print(f"API: Delete student account request for {auth_data['email']}")
+        logger.info("Student account deletion requested", extra={"email": auth_data["email"]})
         
         result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
         student = result.scalar_one_or_none()
@@ -1119,103 +912,82 @@ async def delete_student_account(auth_data: dict = Depends(verify_token), db: As
         if not student:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
         
+        affected_teachers = await release_student_enrollments(db, student.id)
         await db.delete(student)
         await db.commit()
+        invalidate_principal(auth_data["email"], "student")
+        for teacher_id in affected_teachers:
+            snapshot_cache.invalidate(teacher_id=teacher_id)
         
-        print(f"API: Student account deleted successfully")
+        logger.info("Student account deleted", extra={"email": auth_data["email"]})
         return {"success": True, "message": "Student account deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"API: Delete student account error: {e}")
+        logger.exception("Delete student account error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete student account")
 
 # ==================== CLASS ENDPOINTS ====================
 
 @app.get("/classes")
-async def get_classes(auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
-    """Get all classes for the current teacher"""
+async def get_classes(
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None, ge=2000, le=9999),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    auth_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all classes for the current teacher.
+
+    With month/year or from/to, each student's attendance only holds marks in
+    that window and an all-time `totals` object is added.
+    """
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can access classes")
-    
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    window = attendance_window(month, year, from_date, to_date)
     
     result = await db.execute(
-        select(Class)
-        .where(Class.teacher_id == user.id)
-        .options(selectinload(Class.student_records))
+        select(Class).where(Class.teacher_id == auth_data["id"])
     )
     classes = result.scalars().all()
     
+    # Get actively enrolled students of every class in one query
+    result = await db.execute(
+        select(StudentRecord)
+        .join(Enrollment, and_(
+            Enrollment.student_record_id == StudentRecord.id,
+            Enrollment.class_id == StudentRecord.class_id
+        ))
+        .join(Class, Class.id == StudentRecord.class_id)
+        .where(Class.teacher_id == auth_data["id"])
+        .where(Enrollment.status == "active")
+    )
+    active_records_by_class = {}
+    for sr in result.scalars().all():
+        active_records_by_class.setdefault(sr.class_id, []).append(sr)
+    
+    active_record_ids = [sr.id for records in active_records_by_class.values() for sr in records]
+    attendance_map = await load_attendance(db, active_record_ids, window)
+    totals = await mark_totals(db, active_record_ids) if window else None
+    statistics = await class_statistics(db, classes)
+    
     response_classes = []
     for cls in classes:
-        # Get active enrollments
-        enrollment_result = await db.execute(
-            select(Enrollment)
-            .where(Enrollment.class_id == cls.id)
-            .where(Enrollment.status == "active")
-        )
-        active_enrollments = enrollment_result.scalars().all()
-        active_record_ids = {e.student_record_id for e in active_enrollments}
-        
-        # Filter to only active students
         active_students = [
-            {
-                "id": sr.id,
-                "name": sr.name,
-                "rollNo": sr.roll_no,
-                "email": sr.email,
-                "attendance": sr.attendance or {}
-            }
-            for sr in cls.student_records
-            if sr.id in active_record_ids
+            student_payload(sr, attendance_map[sr.id], totals)
+            for sr in active_records_by_class.get(cls.id, [])
         ]
         
-        # Calculate statistics
-        total_students = len(active_students)
-        thresholds = cls.thresholds or {
-            "excellent": 95.0,
-            "good": 90.0,
-            "moderate": 85.0,
-            "atRisk": 85.0
-        }
-        
-        at_risk = 0
-        excellent = 0
-        total_attendance = 0.0
-        
-        for student in active_students:
-            attendance = student["attendance"]
-            if attendance:
-                present = sum(1 for v in attendance.values() if v in ["P", "L"])
-                total = len(attendance)
-                percentage = (present / total * 100.0) if total > 0 else 0.0
-                total_attendance += percentage
-                
-                if percentage >= thresholds.get("excellent", 95.0):
-                    excellent += 1
-                elif percentage < thresholds.get("moderate", 85.0):
-                    at_risk += 1
-        
-        avg_attendance = (total_attendance / total_students) if total_students > 0 else 0.0
-        
         response_classes.append({
             "id": cls.id,
             "name": cls.name,
             "teacher_id": cls.teacher_id,
             "students": active_students,
             "customColumns": cls.custom_columns or [],
-            "thresholds": thresholds,
-            "statistics": {
-                "total_students": total_students,
-                "avg_attendance": round(avg_attendance, 3),
-                "at_risk_count": at_risk,
-                "excellent_count": excellent
-            },
+            "thresholds": class_thresholds(cls),
+            "statistics": statistics[cls.id],
+            "version": cls.version,
             "created_at": cls.created_at.isoformat() if cls.created_at else None,
             "updated_at": cls.updated_at.isoformat() if cls.updated_at else None
         })
@@ -1228,12 +1000,6 @@ async def create_class(class_data: ClassRequest, auth_data: dict = Depends(verif
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can create classes")
     
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     class_id = str(class_data.id)
     
     # Check if class already exists
@@ -1247,7 +1013,7 @@ async def create_class(class_data: ClassRequest, auth_data: dict = Depends(verif
     new_class = Class(
         id=class_id,
         name=class_data.name,
-        teacher_id=user.id,
+        teacher_id=auth_data["id"],
         custom_columns=class_data.customColumns,
         thresholds=class_data.thresholds or {
             "excellent": 95.0,
@@ -1259,38 +1025,47 @@ async def create_class(class_data: ClassRequest, auth_data: dict = Depends(verif
     db.add(new_class)
     
     # Add students
+    marks = []
     for student_data in class_data.students:
         student_record = StudentRecord(
             id=student_data.get("id"),
             class_id=class_id,
             name=student_data.get("name"),
             roll_no=student_data.get("rollNo"),
-            email=student_data.get("email"),
-            attendance=student_data.get("attendance", {})
+            email=student_data.get("email")
         )
         db.add(student_record)
+        marks.extend(mark_rows(student_record.id, student_data.get("attendance", {})))
+    
+    # Records must exist before their marks can reference them
+    await db.flush()
+    await upsert_marks(db, marks)
+    await adjust_teacher_overview(db, auth_data["id"], classes=1)
     
     await db.commit()
-    await update_teacher_overview(user.id, db)
+    snapshot_cache.invalidate(teacher_id=auth_data["id"])
     
     return {"success": True, "class": {"id": class_id, "name": class_data.name}}
 
 @app.get("/classes/{class_id}")
-async def get_class(class_id: str, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
-    """Get a specific class"""
+async def get_class(
+    class_id: str,
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None, ge=2000, le=9999),
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    auth_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a specific class; month/year or from/to window the attendance as in GET /classes"""
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can access classes")
-    
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    window = attendance_window(month, year, from_date, to_date)
     
     result = await db.execute(
         select(Class)
         .where(Class.id == class_id)
-        .where(Class.teacher_id == user.id)
+        .where(Class.teacher_id == auth_data["id"])
         .options(selectinload(Class.student_records))
     )
     cls = result.scalar_one_or_none()
@@ -1308,14 +1083,10 @@ async def get_class(class_id: str, auth_data: dict = Depends(verify_token), db:
     active_record_ids = {e.student_record_id for e in active_enrollments}
     
     # Filter to only active students
+    attendance_map = await load_attendance(db, active_record_ids, window)
+    totals = await mark_totals(db, active_record_ids) if window else None
     active_students = [
-        {
-            "id": sr.id,
-            "name": sr.name,
-            "rollNo": sr.roll_no,
-            "email": sr.email,
-            "attendance": sr.attendance or {}
-        }
+        student_payload(sr, attendance_map[sr.id], totals)
         for sr in cls.student_records
         if sr.id in active_record_ids
     ]
@@ -1328,6 +1099,7 @@ async def get_class(class_id: str, auth_data: dict = Depends(verify_token), db:
             "students": active_students,
             "customColumns": cls.custom_columns or [],
             "thresholds": cls.thresholds,
+            "version": cls.version,
             "created_at": cls.created_at.isoformat() if cls.created_at else None,
             "updated_at": cls.updated_at.isoformat() if cls.updated_at else None
         }
@@ -1336,24 +1108,16 @@ async def get_class(class_id: str, auth_data: dict = Depends(verify_token), db:
 @app.put("/classes/{class_id}")
 async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Update a class - handles student deletions AND preserves inactive student data"""
-    print("=" * 60)
-    print(f"[UPDATE_CLASS] Starting update for class {class_id}")
-    print("=" * 60)
+    logger.debug("update_class start", extra={"class_id": class_id})
     
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can update classes")
     
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # Get class
     result = await db.execute(
         select(Class)
         .where(Class.id == class_id)
-        .where(Class.teacher_id == user.id)
+        .where(Class.teacher_id == auth_data["id"])
         .options(selectinload(Class.student_records))
     )
     cls = result.scalar_one_or_none()
@@ -1363,30 +1127,25 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
     
     # Get ALL students in file (both active and inactive)
     all_students_in_file = cls.student_records
-    print(f"[UPDATE_CLASS] Students in FILE: {len(all_students_in_file)}")
-    for s in all_students_in_file:
-        attendance_count = len(s.attendance or {})
-        print(f"  - ID: {s.id}, Name: {s.name}, Attendance: {attendance_count}")
+    stored_attendance = await load_attendance(db, [s.id for s in all_students_in_file])
     
     # Get incoming students from request
     incoming_students = class_data.students
-    print(f"[UPDATE_CLASS] Students in REQUEST: {len(incoming_students)}")
-    for s in incoming_students:
-        attendance_count = len(s.get("attendance", {}))
-        print(f"  - ID: {s.get('id')}, Name: {s.get('name')}, Attendance: {attendance_count}")
+    
+    # Per-student dumps are only built when DEBUG is enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        for s in all_students_in_file:
+            logger.debug("update_class stored student", extra={"class_id": class_id, "student_id": s.id, "student_name": s.name, "marks": len(stored_attendance[s.id])})
+        for s in incoming_students:
+            logger.debug("update_class incoming student", extra={"class_id": class_id, "student_id": s.get("id"), "student_name": s.get("name"), "marks": len(s.get("attendance", {}))})
     
     # Find deleted students
     current_student_ids = {s.id for s in all_students_in_file}
     new_student_ids = {s.get("id") for s in incoming_students}
     deleted_student_ids = current_student_ids - new_student_ids
     
-    print(f"[UPDATE_CLASS] Analysis:")
-    print(f"  - Current IDs: {current_student_ids}")
-    print(f"  - New IDs: {new_student_ids}")
-    print(f"  - Deleted IDs: {deleted_student_ids}")
-    
     if deleted_student_ids:
-        print(f"[UPDATE_CLASS] Students DELETED by teacher: {deleted_student_ids}")
+        logger.info("Students removed from class", extra={"class_id": class_id, "student_ids": sorted(deleted_student_ids)})
         
         # Mark deleted students as inactive in enrollments
         result = await db.execute(
@@ -1398,10 +1157,10 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
         enrollments_to_deactivate = result.scalars().all()
         
         for enrollment in enrollments_to_deactivate:
-            old_status = enrollment.status
             enrollment.status = "inactive"
             enrollment.removed_by_teacher_at = datetime.utcnow()
-            print(f"  - Marked enrollment {enrollment.student_record_id} as inactive (was {old_status})")
+        
+        await adjust_teacher_overview(db, auth_data["id"], students=-len(enrollments_to_deactivate))
     
     # Update class info
     cls.name = class_data.name
@@ -1412,7 +1171,7 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
     # Build final student list (active + inactive preserved)
     updated_students_map = {s.get("id"): s for s in incoming_students}
     
-    print(f"[UPDATE_CLASS] Building final student list:")
+    incoming_attendance = {}
     for student in all_students_in_file:
         student_id = student.id
         if student_id in updated_students_map:
@@ -1421,18 +1180,22 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
             student.name = updated.get("name")
             student.roll_no = updated.get("rollNo")
             student.email = updated.get("email")
-            student.attendance = updated.get("attendance", {})
-            print(f"  ✓ Including ACTIVE: {student.name} (ID: {student_id}) - Attendance: {len(student.attendance)}")
-        else:
-            # Inactive student - preserve from file
-            print(f"  ✓ Preserving INACTIVE: {student.name} (ID: {student_id}) - Attendance: {len(student.attendance or {})}")
+            incoming_attendance[student_id] = updated.get("attendance", {})
+        # Inactive students keep their stored attendance untouched
+    
+    # Write only the attendance cells that changed
+    changed, removed = await sync_attendance(
+        db,
+        incoming_attendance,
+        current={sid: stored_attendance[sid] for sid in incoming_attendance}
+    )
+    logger.debug("update_class marks synced", extra={"class_id": class_id, "written": changed, "cleared": removed})
     
+    version = await bump_sheet_version(db, class_id)
     await db.commit()
-    await update_teacher_overview(user.id, db)
+    snapshot_cache.invalidate(teacher_id=auth_data["id"])
     
-    # Verification
     await db.refresh(cls)
-    print(f"[UPDATE_CLASS] Verification: File now has {len(cls.student_records)} students")
     
     # Return only active students to frontend
     enrollment_result = await db.execute(
@@ -1442,6 +1205,7 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
     )
     active_enrollments = enrollment_result.scalars().all()
     active_record_ids = {e.student_record_id for e in active_enrollments}
+    attendance_map = await load_attendance(db, active_record_ids)
     
     active_students = [
         {
@@ -1449,7 +1213,7 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
             "name": sr.name,
             "rollNo": sr.roll_no,
             "email": sr.email,
-            "attendance": sr.attendance or {}
+            "attendance": attendance_map[sr.id]
         }
         for sr in cls.student_records
         if sr.id in active_record_ids
@@ -1461,38 +1225,99 @@ async def update_class(class_id: str, class_data: ClassRequest, auth_data: dict
         "students": active_students,
         "customColumns": cls.custom_columns,
         "thresholds": cls.thresholds,
-        "teacher_id": user.id,
+        "version": version,
+        "teacher_id": auth_data["id"],
         "created_at": cls.created_at.isoformat() if cls.created_at else None,
         "updated_at": cls.updated_at.isoformat()
     }
     
     return {"success": True, "class": response_data}
 
+@app.patch("/classes/{class_id}/attendance")
+async def patch_attendance(class_id: str, patch: AttendancePatchRequest, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Apply a batch of attendance cell changes without resending the whole sheet"""
+    if auth_data["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can update classes")
+    
+    result = await db.execute(
+        select(Class.version)
+        .where(Class.id == class_id)
+        .where(Class.teacher_id == auth_data["id"])
+    )
+    current_version = result.scalar_one_or_none()
+    if current_version is None:
+        raise HTTPException(status_code=404, detail="Class not found")
+    
+    # Nothing to apply; bumping would only hand other clients a spurious 409
+    if not patch.changes:
+        return {"success": True, "class_id": class_id, "version": current_version, "applied": 0}
+    
+    # Later changes to the same cell win
+    cells = {}
+    for change in patch.changes:
+        if change.status and change.status not in VALID_STATUSES:
+            raise HTTPException(status_code=400, detail=f"Invalid attendance status: {change.status}")
+        try:
+            day = parse_mark_date(change.date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid attendance date: {change.date}")
+        cells[(change.student_id, day)] = change.status or None
+    
+    student_ids = {student_id for student_id, _ in cells}
+    result = await db.execute(
+        select(StudentRecord.id)
+        .where(StudentRecord.class_id == class_id)
+        .where(StudentRecord.id.in_(student_ids))
+    )
+    unknown_ids = student_ids - set(result.scalars().all())
+    if unknown_ids:
+        raise HTTPException(status_code=404, detail=f"Students not found in class: {sorted(unknown_ids)}")
+    
+    # Bumping first also locks the class row, so concurrent patches apply in version order
+    version = await bump_sheet_version(db, class_id, patch.base_version)
+    if version is None:
+        raise HTTPException(status_code=409, detail="Attendance sheet was changed by another client")
+    
+    await upsert_marks(db, [
+        {"student_record_id": student_id, "date": date, "status": mark}
+        for (student_id, date), mark in cells.items()
+        if mark
+    ])
+    await delete_marks(db, [key for key, mark in cells.items() if not mark])
+    await db.commit()
+    snapshot_cache.invalidate(teacher_id=auth_data["id"])
+    
+    return {"success": True, "class_id": class_id, "version": version, "applied": len(cells)}
+
 @app.delete("/classes/{class_id}")
 async def delete_class(class_id: str, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Delete a class"""
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can delete classes")
     
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     result = await db.execute(
         select(Class)
         .where(Class.id == class_id)
-        .where(Class.teacher_id == user.id)
+        .where(Class.teacher_id == auth_data["id"])
     )
     cls = result.scalar_one_or_none()
     
     if not cls:
         raise HTTPException(status_code=404, detail="Class not found")
     
+    result = await db.execute(
+        select(func.count(Enrollment.id))
+        .where(Enrollment.class_id == class_id)
+        .where(Enrollment.status == "active")
+    )
+    active_students = result.scalar()
+    
     await db.delete(cls)
+    await adjust_teacher_overview(db, auth_data["id"], classes=-1, students=-active_students)
     await db.commit()
-    await update_teacher_overview(user.id, db)
+    # Saved monthly sheets go with the class (ON DELETE CASCADE)
+    sheet_store.invalidate(class_id)
+    snapshot_cache.invalidate(teacher_id=auth_data["id"])
     
     return {"success": True, "message": "Class deleted successfully"}
 
@@ -1514,6 +1339,20 @@ async def get_overview(auth_data: dict = Depends(verify_token), db: AsyncSession
         "last_updated": datetime.utcnow().isoformat()
     }
 
+@app.get("/snapshot")
+async def get_snapshot(
+    month: int = Query(..., ge=1, le=12),
+    year: int = Query(..., ge=2000, le=9999),
+    auth_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Dashboard snapshot for one month: per-class and overall attendance aggregates"""
+    if auth_data["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can access the snapshot")
+    
+    snapshot = await snapshot_cache.load(db, auth_data["id"], year, month)
+    return {"success": True, "snapshot": snapshot}
+
 # ==================== STUDENT ENROLLMENT ENDPOINTS ====================
 
 @app.post("/student/enroll")
@@ -1523,12 +1362,6 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
         if auth_data["role"] != "student":
             raise HTTPException(status_code=403, detail="Only students can enroll")
         
-        result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
-        student = result.scalar_one_or_none()
-        
-        if not student:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
-        
         if request.email != auth_data["email"]:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You must use your registered email")
         
@@ -1542,7 +1375,7 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
         # Check if already actively enrolled
         result = await db.execute(
             select(Enrollment)
-            .where(Enrollment.student_id == student.id)
+            .where(Enrollment.student_id == auth_data["id"])
             .where(Enrollment.class_id == request.class_id)
             .where(Enrollment.status == "active")
         )
@@ -1554,14 +1387,14 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
         # Check if was enrolled before (re-enrollment)
         result = await db.execute(
             select(Enrollment)
-            .where(Enrollment.student_id == student.id)
+            .where(Enrollment.student_id == auth_data["id"])
             .where(Enrollment.class_id == request.class_id)
         )
         previous_enrollment = result.scalar_one_or_none()
         
         if previous_enrollment:
             # RE-ENROLLMENT
-            print(f"[RE-ENROLLMENT] Reactivating enrollment")
+            logger.debug("Reactivating enrollment", extra={"class_id": request.class_id})
             previous_enrollment.status = "active"
             previous_enrollment.re_enrolled_at = datetime.utcnow()
             previous_enrollment.roll_no = request.rollNo
@@ -1576,7 +1409,7 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
             if student_record:
                 student_record.name = request.name
                 student_record.roll_no = request.rollNo
-                attendance_count = len(student_record.attendance or {})
+                attendance_count = await count_marks(db, student_record.id)
                 message = f"Welcome back! Your {attendance_count} attendance records have been restored."
             else:
                 # Create if missing
@@ -1585,20 +1418,20 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
                     class_id=request.class_id,
                     name=request.name,
                     roll_no=request.rollNo,
-                    email=request.email,
-                    attendance={}
+                    email=request.email
                 )
                 db.add(student_record)
                 message = "Re-enrolled successfully"
             
+            await adjust_teacher_overview(db, cls.teacher_id, students=1)
             await db.commit()
-            await update_teacher_overview(cls.teacher_id, db)
+            snapshot_cache.invalidate(teacher_id=cls.teacher_id)
             
             return {"success": True, "message": message, "enrollment": {"status": "re-enrolled"}}
         
         else:
             # NEW ENROLLMENT
-            print(f"[NEW ENROLLMENT] Creating new enrollment")
+            logger.debug("Creating enrollment", extra={"class_id": request.class_id})
             student_record_id = int(datetime.utcnow().timestamp() * 1000)
             
             # Create student record
@@ -1607,14 +1440,13 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
                 class_id=request.class_id,
                 name=request.name,
                 roll_no=request.rollNo,
-                email=request.email,
-                attendance={}
+                email=request.email
             )
             db.add(new_record)
             
             # Create enrollment
             new_enrollment = Enrollment(
-                student_id=student.id,
+                student_id=auth_data["id"],
                 class_id=request.class_id,
                 student_record_id=student_record_id,
                 roll_no=request.rollNo,
@@ -1622,14 +1454,15 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
             )
             db.add(new_enrollment)
             
+            await adjust_teacher_overview(db, cls.teacher_id, students=1)
             await db.commit()
-            await update_teacher_overview(cls.teacher_id, db)
+            snapshot_cache.invalidate(teacher_id=cls.teacher_id)
             
             return {"success": True, "message": "Successfully enrolled in class!", "enrollment": {"status": "enrolled"}}
     
     except ValueError as e:
         error_message = str(e)
-        print(f"[ENROLL_ENDPOINT] ValueError: {error_message}")
+        logger.info("Enrollment rejected: %s", error_message)
         if "already enrolled" in error_message.lower():
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_message)
         else:
@@ -1637,9 +1470,7 @@ async def enroll_in_class(request: StudentEnrollmentRequest, auth_data: dict = D
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ENROLL_ENDPOINT] ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Enrollment error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to enroll in class")
 
 @app.delete("/student/unenroll/{class_id}")
@@ -1649,16 +1480,10 @@ async def unenroll_from_class(class_id: str, auth_data: dict = Depends(verify_to
         if auth_data["role"] != "student":
             raise HTTPException(status_code=403, detail="Only students can unenroll")
         
-        result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
-        student = result.scalar_one_or_none()
-        
-        if not student:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
-        
         # Find active enrollment
         result = await db.execute(
             select(Enrollment)
-            .where(Enrollment.student_id == student.id)
+            .where(Enrollment.student_id == auth_data["id"])
             .where(Enrollment.class_id == class_id)
             .where(Enrollment.status == "active")
         )
@@ -1672,79 +1497,59 @@ async def unenroll_from_class(class_id: str, auth_data: dict = Depends(verify_to
         enrollment.unenrolled_at = datetime.utcnow()
         
         # Get class for teacher update
-        result = await db.execute(select(Class).where(Class.id == class_id))
-        cls = result.scalar_one_or_none()
+        result = await db.execute(select(Class.teacher_id).where(Class.id == class_id))
+        teacher_id = result.scalar_one_or_none()
         
-        await db.commit()
+        if teacher_id:
+            await adjust_teacher_overview(db, teacher_id, students=-1)
         
-        if cls:
-            await update_teacher_overview(cls.teacher_id, db)
+        await db.commit()
+        snapshot_cache.invalidate(teacher_id=teacher_id)
         
         return {"success": True, "message": "Successfully unenrolled from class"}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unenrollment error: {e}")
+        logger.exception("Unenrollment error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to unenroll from class: {str(e)}")
 
 @app.get("/student/classes")
-async def get_student_classes(auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+async def get_student_classes(include_attendance: bool = True, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Get all classes a student is enrolled in"""
     try:
         if auth_data["role"] != "student":
             raise HTTPException(status_code=403, detail="Only students can access this")
         
-        result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
-        student = result.scalar_one_or_none()
-        
-        if not student:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
-        
         result = await db.execute(
             select(Enrollment)
-            .where(Enrollment.student_id == student.id)
+            .where(Enrollment.student_id == auth_data["id"])
             .where(Enrollment.status == "active")
             .options(selectinload(Enrollment.class_obj).selectinload(Class.teacher))
         )
         enrollments = result.scalars().all()
         
+        # Get student records and their statistics for all classes at once
+        record_ids = [e.student_record_id for e in enrollments]
+        result = await db.execute(
+            select(StudentRecord).where(StudentRecord.id.in_(record_ids))
+        )
+        records_by_id = {sr.id: sr for sr in result.scalars().all()}
+        statistics = await student_statistics(db, {
+            e.student_record_id: class_thresholds(e.class_obj)
+            for e in enrollments
+            if e.student_record_id in records_by_id
+        })
+        attendance_map = await load_attendance(db, records_by_id.keys()) if include_attendance else {}
+        
         classes_details = []
         for enrollment in enrollments:
             cls = enrollment.class_obj
             teacher = cls.teacher if cls else None
             teacher_name = teacher.name if teacher else "Unknown"
             
-            # Get student record details
-            result = await db.execute(
-                select(StudentRecord)
-                .where(StudentRecord.id == enrollment.student_record_id)
-            )
-            student_record = result.scalar_one_or_none()
+            student_record = records_by_id.get(enrollment.student_record_id)
             
             if student_record:
-                attendance = student_record.attendance or {}
-                present = sum(1 for v in attendance.values() if v == "P")
-                absent = sum(1 for v in attendance.values() if v == "A")
-                late = sum(1 for v in attendance.values() if v == "L")
-                total = len(attendance)
-                percentage = ((present + late) / total * 100) if total > 0 else 0.0
-                
-                thresholds = cls.thresholds or {
-                    "excellent": 95.0,
-                    "good": 90.0,
-                    "moderate": 85.0,
-                    "atRisk": 85.0
-                }
-                
-                if percentage >= thresholds.get("excellent", 95.0):
-                    status = "excellent"
-                elif percentage >= thresholds.get("good", 90.0):
-                    status = "good"
-                elif percentage >= thresholds.get("moderate", 85.0):
-                    status = "moderate"
-                else:
-                    status = "at risk"
-                
                 class_info = {
                     "class_id": cls.id,
                     "class_name": cls.name,
@@ -1756,17 +1561,10 @@ async def get_student_classes(auth_data: dict = Depends(verify_token), db: Async
                         "name": student_record.name,
                         "rollNo": student_record.roll_no,
                         "email": student_record.email,
-                        "attendance": attendance
+                        "attendance": attendance_map.get(student_record.id, {})
                     },
-                    "thresholds": thresholds,
-                    "statistics": {
-                        "total_classes": total,
-                        "present": present,
-                        "absent": absent,
-                        "late": late,
-                        "percentage": round(percentage, 3),
-                        "status": status
-                    }
+                    "thresholds": class_thresholds(cls),
+                    "statistics": statistics[student_record.id]
                 }
                 classes_details.append(class_info)
         
@@ -1774,7 +1572,7 @@ async def get_student_classes(auth_data: dict = Depends(verify_token), db: Async
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error fetching student classes: {e}")
+        logger.exception("Error fetching student classes")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch classes")
 
 @app.get("/student/class/{class_id}")
@@ -1784,16 +1582,10 @@ async def get_student_class_detail(class_id: str, auth_data: dict = Depends(veri
         if auth_data["role"] != "student":
             raise HTTPException(status_code=403, detail="Only students can access this")
         
-        result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
-        student = result.scalar_one_or_none()
-        
-        if not student:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
-        
         # Get enrollment
         result = await db.execute(
             select(Enrollment)
-            .where(Enrollment.student_id == student.id)
+            .where(Enrollment.student_id == auth_data["id"])
             .where(Enrollment.class_id == class_id)
             .where(Enrollment.status == "active")
         )
@@ -1820,28 +1612,9 @@ async def get_student_class_detail(class_id: str, auth_data: dict = Depends(veri
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student record not found")
         
         # Calculate statistics
-        attendance = student_record.attendance or {}
-        present = sum(1 for v in attendance.values() if v == "P")
-        absent = sum(1 for v in attendance.values() if v == "A")
-        late = sum(1 for v in attendance.values() if v == "L")
-        total = len(attendance)
-        percentage = ((present + late) / total * 100) if total > 0 else 0.0
-        
-        thresholds = cls.thresholds or {
-            "excellent": 95.0,
-            "good": 90.0,
-            "moderate": 85.0,
-            "atRisk": 85.0
-        }
-        
-        if percentage >= thresholds.get("excellent", 95.0):
-            status = "excellent"
-        elif percentage >= thresholds.get("good", 90.0):
-            status = "good"
-        elif percentage >= thresholds.get("moderate", 85.0):
-            status = "moderate"
-        else:
-            status = "at risk"
+        thresholds = class_thresholds(cls)
+        statistics = await student_statistics(db, {student_record.id: thresholds})
+        attendance = (await load_attendance(db, [student_record.id]))[student_record.id]
         
         return {
             "class": {
@@ -1856,20 +1629,13 @@ async def get_student_class_detail(class_id: str, auth_data: dict = Depends(veri
                     "attendance": attendance
                 },
                 "thresholds": thresholds,
-                "statistics": {
-                    "total_classes": total,
-                    "present": present,
-                    "absent": absent,
-                    "late": late,
-                    "percentage": round(percentage, 3),
-                    "status": status
-                }
+                "statistics": statistics[student_record.id]
             }
         }
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error fetching class details: {e}")
+        logger.exception("Error fetching class details")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch class details")
 
 @app.get("/class/verify/{class_id}")
@@ -1900,7 +1666,7 @@ async def verify_class_exists(class_id: str, db: AsyncSession = Depends(get_db))
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error verifying class: {e}")
+        logger.exception("Error verifying class")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to verify class")
 
 # ==================== QR CODE ATTENDANCE ENDPOINTS ====================
@@ -1911,22 +1677,16 @@ async def start_qr_session(request: dict, auth_data: dict = Depends(verify_token
     class_id = request.get("class_id")
     rotation_interval = request.get("rotation_interval", 5)
     
-    print(f"[API] QR start request: class_id={class_id}")
+    logger.debug("QR start request", extra={"class_id": class_id})
     
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can start QR sessions")
     
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # Verify class belongs to teacher
     result = await db.execute(
         select(Class)
         .where(Class.id == class_id)
-        .where(Class.teacher_id == user.id)
+        .where(Class.teacher_id == auth_data["id"])
     )
     cls = result.scalar_one_or_none()
     
@@ -1942,36 +1702,40 @@ async def start_qr_session(request: dict, auth_data: dict = Depends(verify_token
     existing_session = result.scalar_one_or_none()
     
     if existing_session:
-        # Update existing session
-        existing_session.current_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        # Restart existing session with a new secret so old codes stop working
+        existing_session.secret = qr_codes.new_secret()
         existing_session.code_generated_at = datetime.utcnow()
         existing_session.rotation_interval = rotation_interval
         await db.commit()
+        scanned_count = (await count_scanned(db, [existing_session.id]))[existing_session.id]
+        payload = qr_session_payload(existing_session, scanned_count=scanned_count)
+        qr_events.publish(class_id, "code", payload)
         
         return {
             "success": True,
             "session": {
                 "class_id": class_id,
-                "current_code": existing_session.current_code,
-                "attendance_date": existing_session.attendance_date,
+                "current_code": payload["current_code"],
+                "expires_in": payload["expires_in"],
+                "attendance_date": existing_session.attendance_date.isoformat(),
                 "started_at": existing_session.started_at.isoformat(),
                 "rotation_interval": existing_session.rotation_interval,
+                "scanned_count": payload["scanned_count"],
                 "status": "active"
             }
         }
     
     # Create new session
-    today = datetime.now().strftime("%Y-%m-%d")
-    qr_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    today = datetime.now().date()
+    secret = qr_codes.new_secret()
     
     new_session = QRSession(
         class_id=class_id,
-        teacher_id=user.id,
-        current_code=qr_code,
+        teacher_id=auth_data["id"],
+        secret=secret,
         attendance_date=today,
         rotation_interval=rotation_interval,
-        status="active",
-        scanned_students=[]
+        status="active"
     )
     db.add(new_session)
     await db.commit()
@@ -1980,10 +1744,12 @@ async def start_qr_session(request: dict, auth_data: dict = Depends(verify_token
         "success": True,
         "session": {
             "class_id": class_id,
-            "current_code": qr_code,
-            "attendance_date": today,
+            "current_code": qr_codes.current_code(secret, rotation_interval),
+            "expires_in": round(qr_codes.seconds_until_rotation(rotation_interval), 3),
+            "attendance_date": today.isoformat(),
             "started_at": new_session.started_at.isoformat(),
             "rotation_interval": rotation_interval,
+            "scanned_count": 0,
             "status": "active"
         }
     }
@@ -1991,12 +1757,6 @@ async def start_qr_session(request: dict, auth_data: dict = Depends(verify_token
 @app.get("/qr/session/{class_id}")
 async def get_qr_session(class_id: str, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Get current QR session"""
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     result = await db.execute(
         select(QRSession)
         .where(QRSession.class_id == class_id)
@@ -2007,102 +1767,134 @@ async def get_qr_session(class_id: str, auth_data: dict = Depends(verify_token),
     if not session:
         return {"active": False}
     
-    if session.teacher_id != user.id:
+    if session.teacher_id != auth_data["id"]:
         return {"active": False}
     
-    # Auto-rotate code if needed
-    elapsed = (datetime.utcnow() - session.code_generated_at).total_seconds()
-    
-    if elapsed >= session.rotation_interval:
-        session.current_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        session.code_generated_at = datetime.utcnow()
-        await db.commit()
-    
     return {
         "active": True,
-        "session": {
-            "class_id": session.class_id,
-            "current_code": session.current_code,
-            "attendance_date": session.attendance_date,
-            "started_at": session.started_at.isoformat(),
-            "rotation_interval": session.rotation_interval,
-            "scanned_students": session.scanned_students or [],
-            "status": session.status
-        }
+        "session": qr_session_payload(session, scanned=(await load_scanned(db, [session.id]))[session.id])
     }
 
-@app.post("/qr/scan")
-async def scan_qr_code(class_id: str, qr_code: str, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
-    """Student scans QR code to mark attendance"""
-    try:
-        if auth_data["role"] != "student":
-            raise HTTPException(status_code=403, detail="Only students can scan QR codes")
-        
-        result = await db.execute(select(Student).where(Student.email == auth_data["email"]))
-        student = result.scalar_one_or_none()
-        
-        if not student:
-            raise HTTPException(status_code=404, detail="Student not found")
-        
-        # Get active session
+async def refresh_qr_session_event(class_id: str, teacher_id: str) -> dict:
+    """Re-read a session on a stream tick (code rotation, scans from other workers)"""
+    async with AsyncSessionLocal() as db:
         result = await db.execute(
             select(QRSession)
             .where(QRSession.class_id == class_id)
             .where(QRSession.status == "active")
+            .where(QRSession.teacher_id == teacher_id)
         )
         session = result.scalar_one_or_none()
         
         if not session:
-            raise HTTPException(status_code=400, detail="No active QR session")
+            return {"type": "stopped", "data": {"class_id": class_id}}
         
-        if session.current_code != qr_code:
-            raise HTTPException(status_code=400, detail="Invalid or expired QR code")
+        scanned_count = (await count_scanned(db, [session.id]))[session.id]
+        return {"type": "code", "data": qr_session_payload(session, scanned_count=scanned_count)}
+
+@app.get("/qr/session/{class_id}/stream")
+async def stream_qr_session(class_id: str, request: Request, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Stream code rotations and scans for an active QR session as Server-Sent Events"""
+    if auth_data["role"] != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can watch QR sessions")
+    
+    result = await db.execute(
+        select(QRSession)
+        .where(QRSession.class_id == class_id)
+        .where(QRSession.status == "active")
+        .where(QRSession.teacher_id == auth_data["id"])
+    )
+    session = result.scalar_one_or_none()
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="No active session found")
+    
+    teacher_id = auth_data["id"]
+    initial = qr_session_payload(session, scanned=(await load_scanned(db, [session.id]))[session.id])
+    # The stream can stay open for a whole lecture; don't hold a pooled connection for it
+    await db.close()
+    
+    async def events():
+        queue = qr_events.subscribe(class_id)
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + initial["expires_in"]
+        try:
+            yield qr_events.format_sse("session", initial)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=max(0.0, next_tick - loop.time()))
+                except asyncio.TimeoutError:
+                    event = await refresh_qr_session_event(class_id, teacher_id)
+                    next_tick = loop.time() + event["data"].get("expires_in", initial["rotation_interval"])
+                
+                yield qr_events.format_sse(event["type"], event["data"])
+                if event["type"] == "stopped":
+                    break
+        finally:
+            qr_events.unsubscribe(class_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/qr/scan")
+async def scan_qr_code(class_id: str, qr_code: str, auth_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    """Student scans QR code to mark attendance"""
+    try:
+        if auth_data["role"] != "student":
+            raise HTTPException(status_code=403, detail="Only students can scan QR codes")
         
-        # Get enrollment
+        # Active session and the student's active enrollment in one round trip
         result = await db.execute(
-            select(Enrollment)
-            .where(Enrollment.student_id == student.id)
-            .where(Enrollment.class_id == class_id)
+            select(
+                QRSession.id,
+                QRSession.secret,
+                QRSession.rotation_interval,
+                QRSession.attendance_date,
+                Enrollment.student_record_id
+            )
+            .join(Enrollment, Enrollment.class_id == QRSession.class_id)
+            .where(QRSession.class_id == class_id)
+            .where(QRSession.status == "active")
             .where(Enrollment.status == "active")
+            .where(Enrollment.student_id == auth_data["id"])
         )
-        enrollment = result.scalar_one_or_none()
+        row = result.first()
         
-        if not enrollment:
+        if not row:
+            # Slow path, only to report why the scan was rejected
+            result = await db.execute(
+                select(QRSession.id)
+                .where(QRSession.class_id == class_id)
+                .where(QRSession.status == "active")
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=400, detail="No active QR session")
             raise HTTPException(status_code=403, detail="Not enrolled in this class")
         
-        # Get student record
-        result = await db.execute(
-            select(StudentRecord)
-            .where(StudentRecord.id == enrollment.student_record_id)
-        )
-        student_record = result.scalar_one_or_none()
-        
-        if not student_record:
-            raise HTTPException(status_code=404, detail="Student record not found")
-        
-        # Mark attendance
-        attendance = student_record.attendance or {}
-        attendance[session.attendance_date] = "P"
-        student_record.attendance = attendance
-        
-        # Add to scanned list
-        scanned = session.scanned_students or []
-        if student_record.id not in scanned:
-            scanned.append(student_record.id)
-            session.scanned_students = scanned
+        if not qr_codes.verify_code(row.secret, row.rotation_interval, qr_code):
+            raise HTTPException(status_code=400, detail="Invalid or expired QR code")
         
-        await db.commit()
+        # Written to the database by the next batch flush
+        scan_ingestor.submit(PendingScan(
+            class_id=class_id,
+            session_id=row.id,
+            attendance_date=row.attendance_date,
+            student_record_id=row.student_record_id
+        ))
         
         return {
             "message": "Attendance marked as Present",
-            "date": session.attendance_date
+            "date": row.attendance_date.isoformat()
         }
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"QR scan error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("QR scan error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to scan QR code")
 
 @app.post("/qr/stop-session")
@@ -2115,67 +1907,57 @@ async def stop_qr_session(payload: dict, auth_data: dict = Depends(verify_token)
     if auth_data["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can stop QR sessions")
     
-    result = await db.execute(select(Teacher).where(Teacher.email == auth_data["email"]))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     try:
-        # Get session
+        # Write scans still waiting in this worker's buffer before counting absents
+        await scan_ingestor.flush()
+        
+        # Locked so a flush from another worker either commits first or sees the session stopped
         result = await db.execute(
             select(QRSession)
             .where(QRSession.class_id == class_id)
             .where(QRSession.status == "active")
-            .where(QRSession.teacher_id == user.id)
+            .where(QRSession.teacher_id == auth_data["id"])
+            .with_for_update()
         )
         session = result.scalar_one_or_none()
         
         if not session:
             raise HTTPException(status_code=404, detail="No active session found")
         
-        # Get all active enrollments
-        result = await db.execute(
-            select(Enrollment)
-            .where(Enrollment.class_id == class_id)
-            .where(Enrollment.status == "active")
-        )
-        enrollments = result.scalars().all()
-        
-        active_record_ids = {e.student_record_id for e in enrollments}
-        scanned_ids = set(session.scanned_students or [])
+        scanned_count = (await count_scanned(db, [session.id]))[session.id]
         
-        # Mark absents
-        marked_absent = 0
-        for record_id in active_record_ids:
-            if record_id not in scanned_ids:
-                result = await db.execute(
-                    select(StudentRecord).where(StudentRecord.id == record_id)
-                )
-                student_record = result.scalar_one_or_none()
-                
-                if student_record:
-                    attendance = student_record.attendance or {}
-                    if session.attendance_date not in attendance:
-                        attendance[session.attendance_date] = "A"
-                        student_record.attendance = attendance
-                        marked_absent += 1
+        # Mark absents where the date has no mark yet, in one statement
+        marked_absent = await mark_unscanned_absent(db, session.id, class_id, session.attendance_date)
         
         # Stop session
         session.status = "stopped"
         session.stopped_at = datetime.utcnow()
         
         await db.commit()
+        snapshot_cache.invalidate(teacher_id=auth_data["id"])
+        
+        qr_events.publish(class_id, "stopped", {
+            "class_id": class_id,
+            "scanned_count": scanned_count,
+            "absent_count": marked_absent
+        })
         
         return {
-            "scanned_count": len(scanned_ids),
+            "scanned_count": scanned_count,
             "absent_count": marked_absent,
-            "date": session.attendance_date
+            "date": session.attendance_date.isoformat()
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[QR_STOP] Error: {e}")
+        logger.exception("QR stop error")
         raise HTTPException(status_code=500, detail="Failed to stop QR session")
 
+# ==================== MONTHLY SHEETS ====================
+
+# /api/attendance/save and /load, backed by sheet_store; teachers only, for their own classes
+app.include_router(attendance_router)
+
 # ==================== CONTACT ENDPOINT ====================
 
 @app.post("/contact")
@@ -2193,7 +1975,7 @@ async def submit_contact(request: ContactRequest, db: AsyncSession = Depends(get
         
         return {"success": True, "message": "Message received successfully"}
     except Exception as e:
-        print(f"Contact form error: {e}")
+        logger.exception("Contact form error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to process contact form")
 
 # ==================== RUN SERVER ====================
@@ -0,0 +1,198 @@
+from sqlalchemy import text
+
+from app_logging import get_logger
+
+logger = get_logger("migrations")
+
+# Versioned schema migrations, applied in order by init_db at startup.
+#
+# Each step runs once and is recorded in schema_migrations. Steps written
+# before versioning existed were run on every boot, so they stay idempotent;
+# databases that predate the table simply re-run them once. To change the
+# schema, append a new (version, step) pair - never edit or renumber one
+# that has shipped.
+
+async def create_tables(conn):
+    """Baseline: every table in models.py that doesn't exist yet"""
+    from database import Base
+    import models  # noqa: F401 - registers the tables on Base.metadata
+    await conn.run_sync(Base.metadata.create_all)
+
+# Y-M-D with or without zero padding; the day is checked against the month separately
+MARK_DATE_PATTERN = r"^[1-9]\d{3}-(0?[1-9]|1[0-2])-(0?[1-9]|[12]\d|3[01])$"
+
+def _is_calendar_date(key: str) -> str:
+    """SQL condition: `key` is a Y-M-D string naming a real day; never raises on junk (bind :pattern)"""
+    return f"""CASE
+        WHEN {key} ~ :pattern THEN split_part({key}, '-', 3)::int <= extract(day from
+            make_date(split_part({key}, '-', 1)::int, split_part({key}, '-', 2)::int, 1)
+            + interval '1 month - 1 day')
+        ELSE false
+    END"""
+
+def _editor_spelling_first(key: str) -> str:
+    """SQL ORDER BY terms ranking the sheet editor's unpadded spelling of a day ("2025-12-6") first"""
+    return f"{key} = to_char(to_date({key}, 'YYYY-MM-DD'), 'YYYY-MM-DD'), {key}"
+
+async def migrate_attendance_blobs(conn):
+    """Move StudentRecord.attendance JSON blobs into attendance_marks.
+
+    attendance_marks.date may already be a DATE (create_all builds the
+    current model) or still text (databases from before
+    convert_attendance_dates). Keys are parsed into dates either way, so
+    both work; a DATE also assigns to a text column, in padded form.
+    """
+    result = await conn.execute(text("SELECT EXISTS (SELECT 1 FROM student_records WHERE attendance IS NOT NULL)"))
+    if not result.scalar():
+        return
+
+    result = await conn.execute(text(f"""
+        INSERT INTO attendance_marks (student_record_id, date, status)
+        SELECT DISTINCT ON (sr.id, to_date(mark.key, 'YYYY-MM-DD'))
+            sr.id, to_date(mark.key, 'YYYY-MM-DD'), mark.value
+        FROM student_records sr
+        CROSS JOIN LATERAL json_each_text(sr.attendance) AS mark
+        WHERE sr.attendance IS NOT NULL
+          AND json_typeof(sr.attendance) = 'object'
+          AND mark.value IN ('P', 'A', 'L')
+          AND {_is_calendar_date("mark.key")}
+        ORDER BY sr.id, to_date(mark.key, 'YYYY-MM-DD'), {_editor_spelling_first("mark.key")}
+        ON CONFLICT (student_record_id, date) DO NOTHING
+    """), {"pattern": MARK_DATE_PATTERN})
+    if result.rowcount:
+        logger.info("Migrated %d attendance marks out of student_records.attendance", result.rowcount)
+
+    await conn.execute(text("UPDATE student_records SET attendance = NULL WHERE attendance IS NOT NULL"))
+
+async def add_class_version(conn):
+    """Sheet version counter bumped on every attendance edit"""
+    await conn.execute(text("ALTER TABLE classes ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0"))
+
+async def add_qr_session_secret(conn):
+    """QR codes are derived from a per-session secret instead of a stored current_code"""
+    await conn.execute(text("ALTER TABLE qr_sessions ADD COLUMN IF NOT EXISTS secret VARCHAR"))
+    await conn.execute(text("UPDATE qr_sessions SET secret = md5(random()::text || id::text) WHERE secret IS NULL"))
+    await conn.execute(text("ALTER TABLE qr_sessions ALTER COLUMN secret SET NOT NULL"))
+    await conn.execute(text("""
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = current_schema() AND table_name = 'qr_sessions'
+                         AND column_name = 'current_code') THEN
+                ALTER TABLE qr_sessions ALTER COLUMN current_code DROP NOT NULL;
+            END IF;
+        END $$
+    """))
+
+async def migrate_scanned_students(conn):
+    """Move QRSession.scanned_students JSON lists into qr_scans"""
+    await conn.execute(text("""
+        INSERT INTO qr_scans (session_id, student_record_id)
+        SELECT qs.id, scanned.value::bigint
+        FROM qr_sessions qs
+        CROSS JOIN LATERAL json_array_elements_text(qs.scanned_students) AS scanned
+        WHERE qs.scanned_students IS NOT NULL
+          AND json_typeof(qs.scanned_students) = 'array'
+          AND EXISTS (SELECT 1 FROM student_records sr WHERE sr.id = scanned.value::bigint)
+        ON CONFLICT (session_id, student_record_id) DO NOTHING
+    """))
+    await conn.execute(text("UPDATE qr_sessions SET scanned_students = NULL WHERE scanned_students IS NOT NULL"))
+
+async def _column_type(conn, table: str, column: str) -> str:
+    result = await conn.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column})
+    return result.scalar()
+
+async def convert_attendance_dates(conn):
+    """attendance_marks.date and qr_sessions.attendance_date become DATE columns.
+
+    Marks were keyed by whatever string the client sent: the sheet editor
+    writes "2025-12-6", QR sessions "2025-12-06". Keys that aren't calendar
+    dates are dropped, and where both spellings exist for a student and day
+    the sheet editor's mark is kept, since it is the teacher's own edit.
+    """
+    if await _column_type(conn, "attendance_marks", "date") != "date":
+        result = await conn.execute(text(f"""
+            DELETE FROM attendance_marks WHERE NOT {_is_calendar_date("date")}
+        """), {"pattern": MARK_DATE_PATTERN})
+        if result.rowcount:
+            logger.warning("Dropped %d attendance marks whose date key is not a calendar date", result.rowcount)
+
+        result = await conn.execute(text(f"""
+            DELETE FROM attendance_marks WHERE ctid IN (
+                SELECT ctid FROM (
+                    SELECT ctid, row_number() OVER (
+                        PARTITION BY student_record_id, to_date(date, 'YYYY-MM-DD')
+                        ORDER BY {_editor_spelling_first("date")}
+                    ) AS rank
+                    FROM attendance_marks
+                ) ranked
+                WHERE rank > 1
+            )
+        """))
+        if result.rowcount:
+            logger.info("Merged %d attendance marks stored under two spellings of one date", result.rowcount)
+
+        await conn.execute(text(
+            "ALTER TABLE attendance_marks ALTER COLUMN date TYPE DATE USING to_date(date, 'YYYY-MM-DD')"
+        ))
+        logger.info("attendance_marks.date converted to DATE")
+
+    if await _column_type(conn, "qr_sessions", "attendance_date") != "date":
+        await conn.execute(text(
+            "ALTER TABLE qr_sessions ALTER COLUMN attendance_date TYPE DATE USING to_date(attendance_date, 'YYYY-MM-DD')"
+        ))
+
+async def add_lookup_indexes(conn):
+    """Indexes for classes by teacher, rosters by class and a student's enrollments"""
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_classes_teacher_id ON classes (teacher_id)",
+        "CREATE INDEX IF NOT EXISTS ix_student_records_class_id ON student_records (class_id)",
+        "CREATE INDEX IF NOT EXISTS ix_enrollments_student_class ON enrollments (student_id, class_id)",
+        "CREATE INDEX IF NOT EXISTS ix_enrollments_active_class ON enrollments (class_id, student_record_id) "
+        "WHERE status = 'active'",
+        "ANALYZE classes, student_records, enrollments",
+    ):
+        await conn.execute(text(statement))
+
+# Step 1 builds any missing table from the current models, so on a baseline
+# database the later steps meet old tables (student_records still holding
+# blobs) next to new ones (attendance_marks already keyed by DATE); each step
+# must work against either shape.
+MIGRATIONS = [
+    (1, create_tables),
+    (2, migrate_attendance_blobs),
+    (3, add_class_version),
+    (4, add_qr_session_secret),
+    (5, migrate_scanned_students),
+    (6, convert_attendance_dates),
+    (7, add_lookup_indexes),
+]
+
+# Arbitrary key for pg_advisory_xact_lock, held while migrating
+MIGRATION_LOCK_ID = 7305501
+
+async def run_migrations(conn):
+    """Apply pending migrations inside the caller's transaction"""
+    # Workers booting together wait here and then find nothing left to do
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        )
+    """))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    applied = set(result.scalars().all())
+
+    for version, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %d: %s", version, migration.__name__)
+        await migration(conn)
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": version, "name": migration.__name__}
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, ForeignKey, JSON, Text, Float
+from sqlalchemy import Column, String, BigInteger, Boolean, Date, DateTime, ForeignKey, JSON, Text, Float, Index, text
 from database import Base  # ✅ Import Base from database.py
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -40,9 +40,10 @@ class Class(Base):
     
     id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
-    teacher_id = Column(String, ForeignKey("teachers.id", ondelete="CASCADE"), nullable=False)
-    custom_Columns = Column(JSON, default=list)
+    teacher_id = Column(String, ForeignKey("teachers.id", ondelete="CASCADE"), nullable=False, index=True)
+    custom_columns = Column("custom_Columns", JSON, default=list)
     thresholds = Column(JSON, default=dict)
+    version = Column(BigInteger, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -70,19 +71,38 @@ class Enrollment(Base):
     student = relationship("Student", back_populates="enrollments")
     class_obj = relationship("Class", back_populates="enrollments")
     student_record = relationship("StudentRecord", foreign_keys=[student_record_id])
+    
+    __table_args__ = (
+        # A student's enrollments, optionally in one class (enroll / re-enroll / student dashboard)
+        Index("ix_enrollments_student_class", "student_id", "class_id"),
+        # Active rosters, joined to student_records on (class_id, student_record_id)
+        Index("ix_enrollments_active_class", "class_id", "student_record_id", postgresql_where=text("status = 'active'")),
+    )
 
 class StudentRecord(Base):
     __tablename__ = "student_records"
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    class_id = Column(String, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False)
+    class_id = Column(String, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False, index=True)
     name = Column(String, nullable=False)
     roll_no = Column(String, nullable=False)
     email = Column(String, nullable=False)
-    attendance = Column(JSON, default=dict)
+    # Legacy per-student blob; moved into attendance_marks by migrations.py
+    attendance = Column(JSON, nullable=True)
     
     # Relationships
     class_obj = relationship("Class", back_populates="student_records")
+    marks = relationship("AttendanceMark", back_populates="student_record", cascade="all, delete-orphan", passive_deletes=True)
+
+class AttendanceMark(Base):
+    __tablename__ = "attendance_marks"
+    
+    student_record_id = Column(BigInteger, ForeignKey("student_records.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    status = Column(String(1), nullable=False)
+    
+    # Relationships
+    student_record = relationship("StudentRecord", back_populates="marks")
 
 class QRSession(Base):
     __tablename__ = "qr_sessions"
@@ -90,17 +110,30 @@ class QRSession(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     class_id = Column(String, ForeignKey("classes.id", ondelete="CASCADE"), nullable=False, unique=True)
     teacher_id = Column(String, ForeignKey("teachers.id", ondelete="CASCADE"), nullable=False)
-    current_code = Column(String, nullable=False)
-    attendance_date = Column(String, nullable=False)
+    # HMAC key the rotating codes are derived from (see qr_codes.py)
+    secret = Column(String, nullable=False)
+    attendance_date = Column(Date, nullable=False)
     started_at = Column(DateTime, default=datetime.utcnow)
     stopped_at = Column(DateTime, nullable=True)
-    code_generated_at = Column(DateTime, default=datetime.utcnow)
+    code_generated_at = Column(DateTime, default=datetime.utcnow)  # when the secret was issued
     rotation_interval = Column(BigInteger, default=5)
-    scanned_students = Column(JSON, default=list)
+    # Legacy scanned-id list; moved into qr_scans by migrations.py
+    scanned_students = Column(JSON, nullable=True)
     status = Column(String, default="active")
     
     # Relationships
     class_obj = relationship("Class", back_populates="qr_sessions")
+    scans = relationship("QRScan", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+
+class QRScan(Base):
+    __tablename__ = "qr_scans"
+    
+    session_id = Column(BigInteger, ForeignKey("qr_sessions.id", ondelete="CASCADE"), primary_key=True)
+    student_record_id = Column(BigInteger, ForeignKey("student_records.id", ondelete="CASCADE"), primary_key=True)
+    scanned_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    session = relationship("QRSession", back_populates="scans")
 
 class ContactMessage(Base):
     __tablename__ = "contact_messages"
@@ -111,3 +144,22 @@ class ContactMessage(Base):
     subject = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class PendingCode(Base):
+    __tablename__ = "pending_codes"
+    
+    # Shared store for verification / password-reset codes (see code_store.py)
+    namespace = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(JSON, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class MonthlySheet(Base):
+    __tablename__ = "attendance_sheets"
+    
+    # One saved sheet per class and month (see sheet_store.py / attendance.py router)
+    class_id = Column(String, ForeignKey("classes.id", ondelete="CASCADE"), primary_key=True)
+    year = Column(BigInteger, primary_key=True)
+    month = Column(BigInteger, primary_key=True)
+    data = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,80 @@
+"""Teacher overview counters (Teacher.total_classes / total_students).
+
+Endpoints shift the counters with adjust_teacher_overview inside their own
+transaction. reconcile_teacher_overview recomputes every teacher from
+scratch and is meant to be run offline:
+
+    python overview.py
+"""
+import asyncio
+from typing import List
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# database.py reads DATABASE_URL on import, so .env must be loaded first when run as a script
+load_dotenv()
+
+from models import Teacher, Class, Enrollment
+
+async def adjust_teacher_overview(db: AsyncSession, teacher_id: str, classes: int = 0, students: int = 0):
+    """Atomically add deltas to a teacher's counters; committed by the caller"""
+    if not classes and not students:
+        return
+
+    await db.execute(
+        update(Teacher)
+        .where(Teacher.id == teacher_id)
+        .values(
+            total_classes=func.coalesce(Teacher.total_classes, 0) + classes,
+            total_students=func.coalesce(Teacher.total_students, 0) + students
+        )
+    )
+
+async def release_student_enrollments(db: AsyncSession, student_id: str) -> List[str]:
+    """Decrement teacher counters for a student's active enrollments before the student is deleted.
+
+    Returns the ids of the teachers whose classes lost the student.
+    """
+    result = await db.execute(
+        select(Class.teacher_id, func.count(Enrollment.id))
+        .join(Enrollment, Enrollment.class_id == Class.id)
+        .where(Enrollment.student_id == student_id)
+        .where(Enrollment.status == "active")
+        .group_by(Class.teacher_id)
+    )
+    teacher_ids = []
+    for teacher_id, active_count in result.all():
+        await adjust_teacher_overview(db, teacher_id, students=-active_count)
+        teacher_ids.append(teacher_id)
+    return teacher_ids
+
+async def reconcile_teacher_overview(db: AsyncSession) -> int:
+    """Recompute every teacher's counters in a single statement; returns teachers updated"""
+    class_count = (
+        select(func.count(Class.id))
+        .where(Class.teacher_id == Teacher.id)
+        .scalar_subquery()
+    )
+    student_count = (
+        select(func.count(Enrollment.id))
+        .join(Class, Class.id == Enrollment.class_id)
+        .where(Class.teacher_id == Teacher.id)
+        .where(Enrollment.status == "active")
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Teacher).values(total_classes=class_count, total_students=student_count)
+    )
+    await db.commit()
+    return result.rowcount
+
+async def _main():
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        updated = await reconcile_teacher_overview(db)
+    print(f"✅ Reconciled overview counters for {updated} teachers")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
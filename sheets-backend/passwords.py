@@ -0,0 +1,75 @@
+"""Password hashing.
+
+Passwords are stored as PBKDF2-HMAC-SHA256 strings of the form
+`pbkdf2_sha256$<iterations>$<salt>$<hash>`. The KDF is deliberately slow, so
+it runs in a bounded thread pool (hashlib releases the GIL) instead of on the
+event loop. PASSWORD_HASH_ITERATIONS sets the cost and
+PASSWORD_HASH_WORKERS how many hashes may run at once per worker.
+
+Accounts created before this still hold unsalted SHA-256 hex digests. They
+keep verifying, and needs_rehash tells login to replace them (or any hash
+with an outdated iteration count) after the next successful login.
+
+bench_logins.py measures login throughput and event loop lag under load.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+ALGORITHM = "pbkdf2_sha256"
+SALT_BYTES = 16
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+def _hash_sync(password: str, iterations: int) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(_pbkdf2(password, salt, iterations))}"
+
+def _verify_sync(password: str, stored: str) -> bool:
+    try:
+        algorithm, iterations, salt, expected = stored.split("$")
+        if algorithm != ALGORITHM:
+            return False
+        return hmac.compare_digest(_pbkdf2(password, _unb64(salt), int(iterations)), _unb64(expected))
+    except ValueError:
+        return False
+
+def _is_legacy(stored: str) -> bool:
+    return "$" not in stored
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash_sync, password, PASSWORD_HASH_ITERATIONS)
+
+async def verify_password(password: str, stored: str) -> bool:
+    if not stored:
+        return False
+    if _is_legacy(stored):
+        # Legacy unsalted SHA-256 digest; cheap enough to check inline
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    return await _run(_verify_sync, password, stored)
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy digests and hashes made with a different cost"""
+    if _is_legacy(stored):
+        return True
+    parts = stored.split("$")
+    return len(parts) != 4 or parts[0] != ALGORITHM or parts[1] != str(PASSWORD_HASH_ITERATIONS)
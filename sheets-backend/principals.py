@@ -0,0 +1,122 @@
+"""Cache of authenticated principals.
+
+verify_token resolves the (role, email) in a JWT to the account's id and
+name once and keeps the result here, so endpoints get the user's id without
+querying Teacher or Student on every request. Entries expire after
+PRINCIPAL_CACHE_TTL seconds and the least recently used ones are evicted past
+PRINCIPAL_CACHE_SIZE. Profile updates and account deletions invalidate the
+entry; other worker processes pick up such changes when their entry expires.
+
+lookup_identities resolves an email to its teacher and/or student account,
+credentials included, in a single UNION ALL round trip for login, signup
+and password reset.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, union_all, literal, null, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Teacher, Student
+
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+@dataclass(frozen=True)
+class Principal:
+    id: str
+    email: str
+    role: str
+    name: str
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "email": self.email, "role": self.role, "name": self.name}
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[float, Principal]]" = OrderedDict()
+
+def _get(key: Tuple[str, str]) -> Optional[Principal]:
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires_at, principal = entry
+    if expires_at < time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return principal
+
+def _put(principal: Principal):
+    key = (principal.role, principal.email)
+    _cache[key] = (time.monotonic() + PRINCIPAL_CACHE_TTL, principal)
+    _cache.move_to_end(key)
+    while len(_cache) > PRINCIPAL_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+async def resolve_principal(email: str, role: str, session_factory=AsyncSessionLocal) -> Optional[Principal]:
+    """Cached (role, email) -> Principal; None if the account no longer exists.
+
+    A cache miss uses its own short-lived session, so the connection is back
+    in the pool before the endpoint runs.
+    """
+    principal = _get((role, email))
+    if principal is not None:
+        return principal
+
+    model = Teacher if role == "teacher" else Student
+    async with session_factory() as db:
+        result = await db.execute(select(model.id, model.name).where(model.email == email))
+        row = result.first()
+    if row is None:
+        return None
+
+    principal = Principal(id=row.id, email=email, role=role, name=row.name)
+    _put(principal)
+    return principal
+
+def invalidate_principal(email: str, role: Optional[str] = None):
+    """Drop cached principals for an email, for one role or both"""
+    for r in ((role,) if role else ("teacher", "student")):
+        _cache.pop((r, email), None)
+
+@dataclass(frozen=True)
+class Identity:
+    role: str
+    id: str
+    email: str
+    name: str
+    password: str
+    verified: Optional[bool]
+    created_at: Optional[datetime]
+    total_classes: Optional[int] = None
+    total_students: Optional[int] = None
+
+    @property
+    def model(self):
+        return Teacher if self.role == "teacher" else Student
+
+async def lookup_identities(db: AsyncSession, email: str) -> List[Identity]:
+    """Every account registered under an email, teacher first, in one query"""
+    teachers = select(
+        literal("teacher").label("role"), Teacher.id, Teacher.email, Teacher.name, Teacher.password,
+        Teacher.verified, Teacher.created_at, Teacher.total_classes, Teacher.total_students
+    ).where(Teacher.email == email)
+    students = select(
+        literal("student").label("role"), Student.id, Student.email, Student.name, Student.password,
+        Student.verified, Student.created_at, null().cast(BigInteger), null().cast(BigInteger)
+    ).where(Student.email == email)
+
+    result = await db.execute(union_all(teachers, students))
+    identities = [Identity(*row) for row in result.all()]
+    return sorted(identities, key=lambda identity: identity.role != "teacher")
+
+async def lookup_identity(db: AsyncSession, email: str, role: Optional[str] = None) -> Optional[Identity]:
+    """The account for an email, preferring the teacher account unless a role is given"""
+    for identity in await lookup_identities(db, email):
+        if role is None or identity.role == role:
+            return identity
+    return None
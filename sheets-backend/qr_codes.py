@@ -0,0 +1,49 @@
+"""Stateless rotating QR codes.
+
+A session stores only a random secret. The code shown at any moment is an
+HMAC of the current time window (like TOTP), so rotating needs no database
+write and every worker derives the same code. Scans are accepted for the
+current window plus QR_CODE_GRACE_WINDOWS previous ones, so a scan that
+races a rotation still succeeds.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import time
+from typing import Optional
+
+CODE_ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 8
+QR_CODE_GRACE_WINDOWS = int(os.getenv("QR_CODE_GRACE_WINDOWS", "1"))
+
+def new_secret() -> str:
+    return secrets.token_hex(20)
+
+def _window(interval: int, now: float) -> int:
+    return int(now // max(1, interval))
+
+def code_for_window(secret: str, window: int) -> str:
+    digest = hmac.new(secret.encode(), window.to_bytes(8, "big"), hashlib.sha256).digest()
+    return "".join(CODE_ALPHABET[b % len(CODE_ALPHABET)] for b in digest[:CODE_LENGTH])
+
+def current_code(secret: str, interval: int, now: Optional[float] = None) -> str:
+    now = time.time() if now is None else now
+    return code_for_window(secret, _window(interval, now))
+
+def seconds_until_rotation(interval: int, now: Optional[float] = None) -> float:
+    now = time.time() if now is None else now
+    interval = max(1, interval)
+    return interval - (now % interval)
+
+def verify_code(secret: str, interval: int, code: str, now: Optional[float] = None, grace_windows: int = QR_CODE_GRACE_WINDOWS) -> bool:
+    """Check a scanned code against the current and recent windows"""
+    now = time.time() if now is None else now
+    window = _window(interval, now)
+    # Bytes, because compare_digest raises TypeError on non-ASCII str
+    scanned = code.encode()
+    return any(
+        hmac.compare_digest(code_for_window(secret, w).encode(), scanned)
+        for w in range(window - grace_windows, window + 1)
+    )
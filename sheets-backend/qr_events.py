@@ -0,0 +1,41 @@
+"""In-process pub/sub for live QR session updates.
+
+Endpoints publish code rotations, scans and session stops per class; the
+teacher's /qr/session/{class_id}/stream connection subscribes to them.
+Events only reach subscribers in the same worker process, so the stream
+also re-reads the session from the database on every rotation tick.
+"""
+import asyncio
+import json
+from typing import Dict, Set
+
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+def subscribe(class_id: str) -> asyncio.Queue:
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.setdefault(class_id, set()).add(queue)
+    return queue
+
+def unsubscribe(class_id: str, queue: asyncio.Queue):
+    queues = _subscribers.get(class_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _subscribers[class_id]
+
+def publish(class_id: str, event_type: str, data: dict):
+    """Push an event to every subscriber of a class without blocking"""
+    event = {"type": event_type, "data": data}
+    for queue in _subscribers.get(class_id, ()):
+        if queue.full():
+            # A slow reader only needs the latest state, not every step
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Encode an event in text/event-stream format"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
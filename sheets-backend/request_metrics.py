@@ -0,0 +1,113 @@
+"""Per-request database and latency metrics.
+
+metrics_middleware opens a RequestStats for each request in a context
+variable. SQLAlchemy cursor events and the pool's checkout hook add to it:
+statements executed, time spent in them, and time spent waiting for a
+connection. When the handler finishes, the totals are added to per-route
+aggregates (served by /debug/request-metrics) and returned to the client as
+`Server-Timing` and `X-DB-Statements` headers.
+
+A route whose statement count grows with its data (an N+1 loop) shows up as a
+rising max_statements for that route.
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import Request
+from sqlalchemy import event
+
+from database import engine, InstrumentedPool
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    statements: int = 0
+    max_statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    handler_time: float = 0.0
+    max_handler_time: float = 0.0
+
+    def add(self, stats: RequestStats, handler_time: float):
+        self.requests += 1
+        self.statements += stats.statements
+        self.max_statements = max(self.max_statements, stats.statements)
+        self.db_time += stats.db_time
+        self.pool_wait += stats.pool_wait
+        self.handler_time += handler_time
+        self.max_handler_time = max(self.max_handler_time, handler_time)
+
+    def as_dict(self) -> dict:
+        n = self.requests or 1
+        return {
+            "requests": self.requests,
+            "avg_statements": round(self.statements / n, 2),
+            "max_statements": self.max_statements,
+            "avg_db_ms": round(self.db_time / n * 1000, 3),
+            "avg_pool_wait_ms": round(self.pool_wait / n * 1000, 3),
+            "avg_handler_ms": round(self.handler_time / n * 1000, 3),
+            "max_handler_ms": round(self.max_handler_time * 1000, 3)
+        }
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_routes: Dict[str, RouteStats] = {}
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - started
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+def _record_pool_wait(waited: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += waited
+
+InstrumentedPool.wait_listeners.append(_record_pool_wait)
+
+async def metrics_middleware(request: Request, call_next):
+    stats = RequestStats()
+    token = _current.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    handler_time = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    # Unmatched paths share one key so arbitrary URLs can't grow the table
+    key = f"{request.method} {route.path}" if route else "unmatched"
+    _routes.setdefault(key, RouteStats()).add(stats, handler_time)
+
+    response.headers["Server-Timing"] = (
+        f"db;dur={stats.db_time * 1000:.1f}, pool;dur={stats.pool_wait * 1000:.1f}, app;dur={handler_time * 1000:.1f}"
+    )
+    response.headers["X-DB-Statements"] = str(stats.statements)
+    return response
+
+def route_metrics() -> Dict[str, dict]:
+    """Aggregates per "METHOD /route/{template}" since the worker started"""
+    return {key: route.as_dict() for key, route in sorted(_routes.items())}
+
+def reset_route_metrics():
+    _routes.clear()
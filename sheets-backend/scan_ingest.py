@@ -0,0 +1,255 @@
+"""Buffered ingestion of QR scans.
+
+POST /qr/scan only validates the scan and queues it here. A background task
+flushes the queue in batches: one idempotent upsert of attendance marks plus
+one insert into the scanned set, all in a single commit. When a
+whole lecture hall scans at once this turns hundreds of commits into a few.
+If a batch fails, its scans are retried one per transaction so a single bad
+row (e.g. a record deleted mid-session) can't take the rest down with it.
+Students are told a scan succeeded before it is written, so any other failure
+(the database being unreachable, say) keeps every scan queued and retries
+with backoff until it goes through; only scans the database rejects as
+invalid are dropped.
+
+A flush locks the sessions it writes to and skips any that are no longer
+active. stop_qr_session locks the session before marking absentees, so scans
+still buffered in some other worker either land before the stop counts them
+or are discarded after it, never written as "P" over its "A".
+
+Scanned students are rows in qr_scans keyed by (session_id, student_record_id),
+so concurrent inserts from any worker can never drop one another's scans.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, func, exists, literal, and_, Date
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from attendance_marks import upsert_marks
+from snapshot import snapshot_cache
+from database import AsyncSessionLocal
+from models import QRSession, QRScan, Enrollment, AttendanceMark
+import qr_events
+from app_logging import get_logger
+
+logger = get_logger("scan_ingest")
+
+SCAN_BATCH_SIZE = int(os.getenv("SCAN_BATCH_SIZE", "500"))
+SCAN_FLUSH_INTERVAL = int(os.getenv("SCAN_FLUSH_INTERVAL_MS", "200")) / 1000
+# Longest wait between flushes while the database keeps failing
+SCAN_RETRY_MAX_DELAY = float(os.getenv("SCAN_RETRY_MAX_DELAY", "30"))
+
+@dataclass
+class PendingScan:
+    class_id: str
+    session_id: int
+    attendance_date: date
+    student_record_id: int
+
+class ScanIngestor:
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = SCAN_BATCH_SIZE, flush_interval: float = SCAN_FLUSH_INTERVAL):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[PendingScan] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._retry_delay = 0.0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def submit(self, scan: PendingScan):
+        """Queue a validated scan; never touches the database"""
+        self._pending.append(scan)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error("%d scans could not be written before shutdown", len(self._pending))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._retry_delay:
+                await asyncio.sleep(self._retry_delay)
+
+    async def flush(self) -> int:
+        """Write all queued scans in one transaction; returns scans written"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, []
+            try:
+                written, scanned_counts = await self._write(batch)
+                self._retry_delay = 0.0
+            except Exception as e:
+                # A single bad row (say its record was deleted mid-session) fails the
+                # whole batch, so fall back to one transaction per scan to isolate it
+                logger.warning("Flush of %d scans failed, writing them one by one: %s", len(batch), e)
+                written, scanned_counts = await self._write_each(batch)
+
+            for class_id in {scan.class_id for scan in written}:
+                snapshot_cache.invalidate(class_id=class_id)
+            for scan in written:
+                qr_events.publish(scan.class_id, "scan", {
+                    "class_id": scan.class_id,
+                    "student_record_id": scan.student_record_id,
+                    "scanned_count": scanned_counts.get(scan.session_id, 0)
+                })
+            return len(written)
+
+    async def _write_each(self, batch: List[PendingScan]) -> Tuple[List[PendingScan], Dict[int, int]]:
+        """Write scans individually; invalid ones are dropped, the rest requeued on any other error"""
+        written, scanned_counts = [], {}
+        for i, scan in enumerate(batch):
+            try:
+                stored, counts = await self._write([scan])
+                written.extend(stored)
+                scanned_counts.update(counts)
+            except IntegrityError as e:
+                # e.g. the student record was deleted; there is nothing left to mark
+                logger.error("Dropping scan the database rejected: %s", e,
+                             extra={"session_id": scan.session_id, "student_record_id": scan.student_record_id})
+            except Exception as e:
+                # Not this row's fault, so the rest would fail too; marks are upserts, so retrying is safe
+                logger.warning("Scan write failed, requeueing %d scans: %s", len(batch) - i, e)
+                self._pending[:0] = batch[i:]
+                # Back off while the database is failing: interval, 2x, 4x ... up to the max
+                self._retry_delay = min(SCAN_RETRY_MAX_DELAY, max(self.flush_interval, self._retry_delay * 2))
+                break
+        else:
+            self._retry_delay = 0.0
+        return written, scanned_counts
+
+    async def _write(self, batch: List[PendingScan]) -> Tuple[List[PendingScan], Dict[int, int]]:
+        """Write the scans of still-active sessions; returns those written and each session's scanned count"""
+        async with self.session_factory() as db:
+            # Shared row locks, taken in id order, hold off a concurrent stop until this commits
+            result = await db.execute(
+                select(QRSession.id)
+                .where(QRSession.id.in_(list({scan.session_id for scan in batch})))
+                .where(QRSession.status == "active")
+                .order_by(QRSession.id)
+                .with_for_update(read=True)
+            )
+            active = set(result.scalars().all())
+            stale = [scan for scan in batch if scan.session_id not in active]
+            if stale:
+                # The stop already marked these students absent
+                logger.warning("Discarding %d scans for sessions stopped before they were written", len(stale))
+            batch = [scan for scan in batch if scan.session_id in active]
+            if not batch:
+                return [], {}
+
+            await self._store(db, batch)
+            scanned_counts = await count_scanned(db, active)
+            await db.commit()
+
+        return batch, scanned_counts
+
+    async def _store(self, db: AsyncSession, batch: List[PendingScan]):
+        # One row per key: Postgres rejects an upsert that touches the same row twice
+        marks = {
+            (scan.student_record_id, scan.attendance_date): {
+                "student_record_id": scan.student_record_id,
+                "date": scan.attendance_date,
+                "status": "P"
+            }
+            for scan in batch
+        }
+        scans = {
+            (scan.session_id, scan.student_record_id): {
+                "session_id": scan.session_id,
+                "student_record_id": scan.student_record_id
+            }
+            for scan in batch
+        }
+
+        await upsert_marks(db, list(marks.values()))
+        await db.execute(
+            insert(QRScan)
+            .values(list(scans.values()))
+            .on_conflict_do_nothing(index_elements=[QRScan.session_id, QRScan.student_record_id])
+        )
+
+async def load_scanned(db: AsyncSession, session_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """Scanned student_record_ids per session, in scan order"""
+    session_ids = list(session_ids)
+    scanned = {session_id: [] for session_id in session_ids}
+    if not session_ids:
+        return scanned
+
+    result = await db.execute(
+        select(QRScan.session_id, QRScan.student_record_id)
+        .where(QRScan.session_id.in_(session_ids))
+        .order_by(QRScan.scanned_at)
+    )
+    for session_id, record_id in result:
+        scanned[session_id].append(record_id)
+    return scanned
+
+async def count_scanned(db: AsyncSession, session_ids: Iterable[int]) -> Dict[int, int]:
+    session_ids = list(session_ids)
+    counts = {session_id: 0 for session_id in session_ids}
+    if not session_ids:
+        return counts
+
+    result = await db.execute(
+        select(QRScan.session_id, func.count())
+        .where(QRScan.session_id.in_(session_ids))
+        .group_by(QRScan.session_id)
+    )
+    counts.update(result.all())
+    return counts
+
+async def mark_unscanned_absent(db: AsyncSession, session_id: int, class_id: str, attendance_date: date) -> int:
+    """Mark every active, unscanned student without a mark for the date absent.
+
+    A single INSERT ... SELECT regardless of class size; returns rows inserted.
+    """
+    not_scanned = ~exists().where(and_(
+        QRScan.session_id == session_id,
+        QRScan.student_record_id == Enrollment.student_record_id
+    ))
+    absentees = (
+        select(Enrollment.student_record_id, literal(attendance_date, Date), literal("A"))
+        .where(Enrollment.class_id == class_id)
+        .where(Enrollment.status == "active")
+        .where(not_scanned)
+    )
+    result = await db.execute(
+        insert(AttendanceMark)
+        .from_select(["student_record_id", "date", "status"], absentees)
+        .on_conflict_do_nothing(index_elements=[AttendanceMark.student_record_id, AttendanceMark.date])
+    )
+    return result.rowcount
+
+scan_ingestor = ScanIngestor()
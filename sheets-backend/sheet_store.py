@@ -0,0 +1,88 @@
+"""Saved monthly attendance sheets for the /api/attendance router.
+
+Sheets are rows in attendance_sheets keyed by (class_id, year, month), so a
+load is a single primary-key read. A bounded LRU cache sits in front:
+loads read through it, saves write the new sheet to the database and then
+into the cache. Entries also expire after SHEET_CACHE_TTL seconds so other
+workers' saves become visible.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import MonthlySheet
+
+SHEET_CACHE_SIZE = int(os.getenv("SHEET_CACHE_SIZE", "256"))
+SHEET_CACHE_TTL = float(os.getenv("SHEET_CACHE_TTL", "30"))
+
+SheetKey = Tuple[str, int, int]
+
+class SheetStore:
+    def __init__(self, max_entries: int = SHEET_CACHE_SIZE, ttl: float = SHEET_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: "OrderedDict[SheetKey, Tuple[float, dict]]" = OrderedDict()
+
+    def _cached(self, key: SheetKey) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, sheet = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return sheet
+
+    def _remember(self, key: SheetKey, sheet: dict):
+        self._cache[key] = (time.monotonic() + self.ttl, sheet)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, class_id: str, year: Optional[int] = None, month: Optional[int] = None):
+        """Drop one cached month, or every month of a class"""
+        if year is not None and month is not None:
+            self._cache.pop((class_id, year, month), None)
+            return
+        for key in [key for key in self._cache if key[0] == class_id]:
+            del self._cache[key]
+
+    async def load(self, db: AsyncSession, class_id: str, year: int, month: int) -> Optional[dict]:
+        key = (class_id, year, month)
+        sheet = self._cached(key)
+        if sheet is not None:
+            return sheet
+
+        result = await db.execute(
+            select(MonthlySheet.data)
+            .where(MonthlySheet.class_id == class_id)
+            .where(MonthlySheet.year == year)
+            .where(MonthlySheet.month == month)
+        )
+        sheet = result.scalar_one_or_none()
+        if sheet is not None:
+            self._remember(key, sheet)
+        return sheet
+
+    async def save(self, db: AsyncSession, class_id: str, year: int, month: int, sheet: dict):
+        """Upsert and commit a sheet, then cache it"""
+        now = datetime.utcnow()
+        await db.execute(
+            insert(MonthlySheet)
+            .values(class_id=class_id, year=year, month=month, data=sheet, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[MonthlySheet.class_id, MonthlySheet.year, MonthlySheet.month],
+                set_={"data": sheet, "updated_at": now}
+            )
+        )
+        await db.commit()
+        self._remember((class_id, year, month), sheet)
+
+sheet_store = SheetStore()
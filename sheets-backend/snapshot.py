@@ -0,0 +1,145 @@
+"""Monthly dashboard snapshot.
+
+monthly_snapshot computes what SnapshotView used to work out in the browser
+(per-student attendance for one month, bucketed with each class's
+thresholds, and per-class and overall totals). The marks are counted by the
+database in a single grouped query, so the response size and the Python work
+depend on the number of students rather than the number of marks.
+
+Results are cached per (teacher, year, month). Writes that change marks,
+enrollments or classes call snapshot_cache.invalidate for the teacher or
+class. Entries also expire after SNAPSHOT_CACHE_TTL seconds so other
+workers' writes become visible.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Class, Enrollment, StudentRecord, AttendanceMark
+from attendance_marks import month_window, in_window
+from attendance_stats import DEFAULT_THRESHOLDS, attendance_status, mark_count_columns
+
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "512"))
+SNAPSHOT_CACHE_TTL = float(os.getenv("SNAPSHOT_CACHE_TTL", "60"))
+
+SnapshotKey = Tuple[str, int, int]
+
+def _percentage(attended: int, total: int) -> float:
+    return round(attended / total * 100, 3) if total > 0 else 0.0
+
+async def monthly_snapshot(db: AsyncSession, teacher_id: str, year: int, month: int) -> dict:
+    """Per-class and overall attendance aggregates for one teacher-month"""
+    result = await db.execute(
+        select(Class.id, Class.name, Class.thresholds).where(Class.teacher_id == teacher_id)
+    )
+    classes = result.all()
+
+    # Actively enrolled students with their marks for the month; no marks -> zero counts
+    result = await db.execute(
+        select(*mark_count_columns(StudentRecord.class_id, StudentRecord.id, StudentRecord.name, StudentRecord.roll_no))
+        .join(Enrollment, and_(
+            Enrollment.student_record_id == StudentRecord.id,
+            Enrollment.class_id == StudentRecord.class_id
+        ))
+        .join(Class, Class.id == StudentRecord.class_id)
+        .outerjoin(AttendanceMark, and_(
+            AttendanceMark.student_record_id == StudentRecord.id,
+            in_window(month_window(year, month))
+        ))
+        .where(Class.teacher_id == teacher_id)
+        .where(Enrollment.status == "active")
+        .group_by(StudentRecord.class_id, StudentRecord.id, StudentRecord.name, StudentRecord.roll_no)
+    )
+    rows_by_class = {}
+    for row in result:
+        rows_by_class.setdefault(row.class_id, []).append(row)
+
+    overall = {"total_classes": len(classes), "total_students": 0, "overall_attendance": 0.0,
+               "at_risk_count": 0, "excellent_count": 0}
+    overall_attended = overall_total = 0
+    class_snapshots = []
+    for class_id, name, thresholds in classes:
+        thresholds = thresholds or dict(DEFAULT_THRESHOLDS)
+        attended = total = at_risk = excellent = 0
+        students = []
+        for row in rows_by_class.get(class_id, []):
+            percentage = _percentage(row.present + row.late, row.total)
+            status = attendance_status(percentage, thresholds)
+            at_risk += status == "at risk"
+            excellent += status == "excellent"
+            attended += row.present + row.late
+            total += row.total
+            students.append({
+                "id": row.id,
+                "name": row.name,
+                "rollNo": row.roll_no,
+                "present": row.present,
+                "absent": row.absent,
+                "late": row.late,
+                "total": row.total,
+                "attendance": percentage,
+                "status": status
+            })
+        students.sort(key=lambda student: student["attendance"], reverse=True)
+
+        class_snapshots.append({
+            "id": class_id,
+            "name": name,
+            "thresholds": thresholds,
+            "student_count": len(students),
+            "avg_attendance": _percentage(attended, total),
+            "at_risk_count": at_risk,
+            "excellent_count": excellent,
+            "students": students
+        })
+        overall["total_students"] += len(students)
+        overall["at_risk_count"] += at_risk
+        overall["excellent_count"] += excellent
+        overall_attended += attended
+        overall_total += total
+
+    overall["overall_attendance"] = _percentage(overall_attended, overall_total)
+    return {"year": year, "month": month, "overall": overall, "classes": class_snapshots}
+
+class SnapshotCache:
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE, ttl: float = SNAPSHOT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: "OrderedDict[SnapshotKey, Tuple[float, dict]]" = OrderedDict()
+
+    def _cached(self, key: SnapshotKey) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return snapshot
+
+    def _remember(self, key: SnapshotKey, snapshot: dict):
+        self._cache[key] = (time.monotonic() + self.ttl, snapshot)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, teacher_id: Optional[str] = None, class_id: Optional[str] = None):
+        """Drop every cached month of a teacher, or of whichever teacher owns a class"""
+        for key, (_, snapshot) in list(self._cache.items()):
+            if key[0] == teacher_id or any(cls["id"] == class_id for cls in snapshot["classes"]):
+                del self._cache[key]
+
+    async def load(self, db: AsyncSession, teacher_id: str, year: int, month: int) -> dict:
+        key = (teacher_id, year, month)
+        snapshot = self._cached(key)
+        if snapshot is None:
+            snapshot = await monthly_snapshot(db, teacher_id, year, month)
+            self._remember(key, snapshot)
+        return snapshot
+
+snapshot_cache = SnapshotCache()
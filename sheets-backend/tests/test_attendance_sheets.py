@@ -0,0 +1,28 @@
+"""/api/attendance: saved monthly sheets are private to the class's teacher."""
+
+def sheet(class_id: str, month: int = 1) -> dict:
+    return {"classId": class_id, "className": "Class 0", "month": month, "year": 2025, "students": [], "thresholds": {}}
+
+async def test_owner_can_save_and_load(client, make_teacher):
+    _, headers, (class_id,) = await make_teacher()
+
+    saved = await client.post("/api/attendance/save", json=sheet(class_id), headers=headers)
+    assert saved.status_code == 200, saved.text
+    loaded = await client.get(f"/api/attendance/load/{class_id}", params={"month": 1, "year": 2025}, headers=headers)
+    assert loaded.status_code == 200
+    assert loaded.json()["classId"] == class_id
+
+async def test_other_teacher_cannot_read_or_overwrite(client, make_teacher):
+    _, owner, (class_id,) = await make_teacher()
+    _, intruder, _ = await make_teacher()
+    await client.post("/api/attendance/save", json=sheet(class_id), headers=owner)
+
+    loaded = await client.get(f"/api/attendance/load/{class_id}", params={"month": 1, "year": 2025}, headers=intruder)
+    assert loaded.status_code == 404
+    saved = await client.post("/api/attendance/save", json=sheet(class_id), headers=intruder)
+    assert saved.status_code == 404
+
+async def test_month_is_one_based(client, make_teacher):
+    _, headers, (class_id,) = await make_teacher()
+    saved = await client.post("/api/attendance/save", json=sheet(class_id, month=0), headers=headers)
+    assert saved.status_code == 422
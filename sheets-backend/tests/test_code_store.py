@@ -0,0 +1,23 @@
+"""The SQL code store's per-namespace size cap."""
+import uuid
+
+async def test_sql_code_store_evicts_oldest_beyond_cap(client):
+    from sqlalchemy import delete
+    from code_store import SQLCodeStore
+    from database import AsyncSessionLocal
+    from models import PendingCode
+
+    store = SQLCodeStore(max_entries=3)
+    namespace = f"test_{uuid.uuid4().hex[:12]}"
+    try:
+        for i in range(5):
+            await store.set(namespace, f"user{i}@example.com", {"code": str(i)}, ttl=60 + i)
+
+        assert await store.get(namespace, "user0@example.com") is None
+        assert await store.get(namespace, "user1@example.com") is None
+        for i in range(2, 5):
+            assert await store.get(namespace, f"user{i}@example.com") == {"code": str(i)}
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(PendingCode).where(PendingCode.namespace == namespace))
+            await db.commit()
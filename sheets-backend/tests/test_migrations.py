@@ -0,0 +1,101 @@
+"""Migration steps against hand-built pre-migration tables in a scratch schema."""
+import json
+
+import pytest
+
+BLOB = {
+    "2025-12-6": "P",    # sheet editor spelling, wins
+    "2025-12-06": "A",   # QR spelling of the same day
+    "2025-1-5": "L",
+    "2025-2-30": "P",    # not a calendar day
+    "junk": "P",
+    "2025-1-7": "X",     # not a status
+}
+
+async def create_tables(conn, date_type: str):
+    from sqlalchemy import text
+
+    await conn.execute(text("CREATE TABLE student_records (id BIGINT PRIMARY KEY, attendance JSON)"))
+    await conn.execute(text(f"""
+        CREATE TABLE attendance_marks (
+            student_record_id BIGINT, date {date_type}, status VARCHAR(1),
+            PRIMARY KEY (student_record_id, date)
+        )
+    """))
+    await conn.execute(text("CREATE TABLE qr_sessions (id BIGINT PRIMARY KEY, attendance_date VARCHAR)"))
+    await conn.execute(text("INSERT INTO student_records VALUES (1, CAST(:blob AS JSON))"), {"blob": json.dumps(BLOB)})
+
+@pytest.mark.parametrize("date_type", ["DATE", "VARCHAR"])
+async def test_attendance_blobs_migrate_into_text_or_date_column(scratch_conn, date_type):
+    from sqlalchemy import text
+    import migrations
+
+    await create_tables(scratch_conn, date_type)
+    await migrations.migrate_attendance_blobs(scratch_conn)
+    await migrations.convert_attendance_dates(scratch_conn)
+
+    result = await scratch_conn.execute(text(
+        "SELECT to_char(date, 'YYYY-MM-DD'), status FROM attendance_marks ORDER BY date"
+    ))
+    assert result.all() == [("2025-01-05", "L"), ("2025-12-06", "P")]
+    result = await scratch_conn.execute(text("SELECT attendance FROM student_records"))
+    assert result.scalar() is None
+
+async def test_convert_keeps_sheet_editor_spelling(scratch_conn):
+    from sqlalchemy import text
+    import migrations
+
+    await create_tables(scratch_conn, "VARCHAR")
+    await scratch_conn.execute(text("""
+        INSERT INTO attendance_marks VALUES (1, '2025-3-4', 'A'), (1, '2025-03-04', 'P'), (1, '2025-13-1', 'P')
+    """))
+    await migrations.convert_attendance_dates(scratch_conn)
+
+    result = await scratch_conn.execute(text("SELECT to_char(date, 'YYYY-MM-DD'), status FROM attendance_marks"))
+    assert result.all() == [("2025-03-04", "A")]
+
+async def test_run_migrations_upgrades_baseline_database(scratch_conn):
+    """The tables as the app first shipped them, before any versioned step ran"""
+    from sqlalchemy import text
+    import migrations
+
+    await scratch_conn.execute(text("""
+        CREATE TABLE classes (
+            id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, teacher_id VARCHAR NOT NULL,
+            "custom_Columns" JSON, thresholds JSON, created_at TIMESTAMP, updated_at TIMESTAMP
+        )
+    """))
+    await scratch_conn.execute(text("""
+        CREATE TABLE student_records (
+            id BIGSERIAL PRIMARY KEY, class_id VARCHAR NOT NULL, name VARCHAR NOT NULL,
+            roll_no VARCHAR NOT NULL, email VARCHAR NOT NULL, attendance JSON
+        )
+    """))
+    await scratch_conn.execute(text("""
+        CREATE TABLE qr_sessions (
+            id BIGSERIAL PRIMARY KEY, class_id VARCHAR NOT NULL UNIQUE, teacher_id VARCHAR NOT NULL,
+            current_code VARCHAR NOT NULL, attendance_date VARCHAR NOT NULL, started_at TIMESTAMP,
+            stopped_at TIMESTAMP, code_generated_at TIMESTAMP, rotation_interval BIGINT,
+            scanned_students JSON, status VARCHAR
+        )
+    """))
+    await scratch_conn.execute(text("INSERT INTO classes (id, name, teacher_id) VALUES ('c1', 'Class', 't1')"))
+    await scratch_conn.execute(
+        text("INSERT INTO student_records VALUES (1, 'c1', 'Student', '1', 's@example.com', CAST(:blob AS JSON))"),
+        {"blob": json.dumps(BLOB)}
+    )
+    await scratch_conn.execute(text("""
+        INSERT INTO qr_sessions (id, class_id, teacher_id, current_code, attendance_date, scanned_students)
+        VALUES (1, 'c1', 't1', 'ABCDEFGH', '2025-12-06', '[1, 99]')
+    """))
+
+    await migrations.run_migrations(scratch_conn)
+
+    result = await scratch_conn.execute(text(
+        "SELECT to_char(date, 'YYYY-MM-DD'), status FROM attendance_marks ORDER BY date"
+    ))
+    assert result.all() == [("2025-01-05", "L"), ("2025-12-06", "P")]
+    result = await scratch_conn.execute(text("SELECT session_id, student_record_id FROM qr_scans"))
+    assert result.all() == [(1, 1)]
+    result = await scratch_conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+    assert result.scalars().all() == [version for version, _ in migrations.MIGRATIONS]
@@ -0,0 +1,13 @@
+import qr_codes
+
+SECRET = "0" * 40
+
+def test_current_code_verifies_within_grace_window():
+    code = qr_codes.current_code(SECRET, 5, now=100.0)
+    assert qr_codes.verify_code(SECRET, 5, code, now=100.0)
+    assert qr_codes.verify_code(SECRET, 5, code, now=105.0, grace_windows=1)
+    assert not qr_codes.verify_code(SECRET, 5, code, now=115.0, grace_windows=1)
+
+def test_non_ascii_code_is_rejected_not_raised():
+    assert not qr_codes.verify_code(SECRET, 5, "ÄBCDEFGH", now=100.0)
+    assert not qr_codes.verify_code(SECRET, 5, "", now=100.0)
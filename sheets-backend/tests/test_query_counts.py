@@ -0,0 +1,32 @@
+"""Endpoints whose statement count must not grow with the data they return.
+
+Counts come from the X-DB-Statements header added by request_metrics. Each
+endpoint is called once to warm the principal cache before measuring.
+"""
+
+def statements(response) -> int:
+    assert response.status_code == 200, response.text
+    return int(response.headers["X-DB-Statements"])
+
+async def test_get_classes_query_count_is_constant(client, make_teacher):
+    _, small, _ = await make_teacher(classes=1, students=2)
+    _, large, _ = await make_teacher(classes=8, students=5)
+
+    for headers in (small, large):
+        await client.get("/classes", headers=headers)
+
+    one_class = statements(await client.get("/classes", headers=small))
+    many_classes = statements(await client.get("/classes", headers=large))
+    assert many_classes == one_class
+
+async def test_stop_qr_session_query_count_is_constant(client, make_teacher):
+    counts = []
+    for students in (2, 40):
+        _, headers, (class_id,) = await make_teacher(classes=1, students=students)
+        started = await client.post("/qr/start-session", json={"class_id": class_id}, headers=headers)
+        assert started.status_code == 200, started.text
+
+        stopped = await client.post("/qr/stop-session", json={"class_id": class_id}, headers=headers)
+        assert stopped.json()["absent_count"] == students
+        counts.append(statements(stopped))
+    assert counts[0] == counts[1]
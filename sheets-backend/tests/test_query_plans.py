@@ -0,0 +1,50 @@
+"""The lookups behind most endpoints can use the indexes from migrations.add_lookup_indexes.
+
+Each probe is EXPLAINed in a freshly migrated scratch schema. Sequential
+scans are disabled for the check, since on empty tables the planner rightly
+prefers them even when the index exists.
+"""
+import json
+
+import pytest
+
+def hot_lookups():
+    from sqlalchemy import select
+    from models import Class, StudentRecord, Enrollment
+
+    return {
+        "classes_by_teacher": (select(Class.id).where(Class.teacher_id == "probe"), "ix_classes_teacher_id"),
+        "records_by_class": (select(StudentRecord.id).where(StudentRecord.class_id == "probe"), "ix_student_records_class_id"),
+        "active_roster": (
+            select(Enrollment.student_record_id).where(Enrollment.class_id == "probe").where(Enrollment.status == "active"),
+            "ix_enrollments_active_class"
+        ),
+        "student_enrollment": (
+            select(Enrollment.id).where(Enrollment.student_id == "probe").where(Enrollment.class_id == "probe"),
+            "ix_enrollments_student_class"
+        ),
+    }
+
+def plan_indexes(plan: dict) -> list:
+    """Index names used anywhere in an EXPLAIN (FORMAT JSON) plan node"""
+    names = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", []):
+        names.extend(plan_indexes(child))
+    return names
+
+@pytest.mark.parametrize("lookup", ["classes_by_teacher", "records_by_class", "active_roster", "student_enrollment"])
+async def test_hot_lookup_uses_its_index(scratch_conn, lookup):
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+    import migrations
+
+    await migrations.run_migrations(scratch_conn)
+    await scratch_conn.execute(text("SET LOCAL enable_seqscan = off"))
+
+    query, expected = hot_lookups()[lookup]
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    result = await scratch_conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    assert expected in plan_indexes(plan[0]["Plan"])
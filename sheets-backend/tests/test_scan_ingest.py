@@ -0,0 +1,103 @@
+"""Buffered scan writes when the database fails or the session stops first."""
+from datetime import date
+
+async def open_session(class_id: str, teacher_id: str):
+    from sqlalchemy import select
+    import qr_codes
+    from database import AsyncSessionLocal
+    from models import QRSession, StudentRecord
+
+    async with AsyncSessionLocal() as db:
+        session = QRSession(class_id=class_id, teacher_id=teacher_id, secret=qr_codes.new_secret(),
+                            attendance_date=date(2025, 12, 6))
+        db.add(session)
+        await db.commit()
+        result = await db.execute(select(StudentRecord.id).where(StudentRecord.class_id == class_id))
+        return session.id, result.scalars().all()
+
+async def stored(session_id: int, class_id: str):
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import QRScan, AttendanceMark, StudentRecord
+
+    async with AsyncSessionLocal() as db:
+        scans = await db.execute(select(QRScan.student_record_id).where(QRScan.session_id == session_id))
+        marks = await db.execute(
+            select(AttendanceMark.student_record_id, AttendanceMark.status)
+            .join(StudentRecord, StudentRecord.id == AttendanceMark.student_record_id)
+            .where(StudentRecord.class_id == class_id)
+        )
+        return sorted(scans.scalars().all()), sorted(marks.all())
+
+async def test_scans_are_kept_through_a_database_outage(client, make_teacher):
+    from scan_ingest import ScanIngestor, PendingScan
+
+    teacher_id, _, (class_id,) = await make_teacher(classes=1, students=3)
+    session_id, record_ids = await open_session(class_id, teacher_id)
+
+    ingestor = ScanIngestor(flush_interval=0.01)
+    write = ingestor._write
+    outage = {"failures": 10}
+
+    async def flaky_write(batch):
+        if outage["failures"]:
+            outage["failures"] -= 1
+            raise ConnectionRefusedError("database is down")
+        return await write(batch)
+
+    ingestor._write = flaky_write
+    for record_id in record_ids:
+        ingestor.submit(PendingScan(class_id=class_id, session_id=session_id,
+                                    attendance_date=date(2025, 12, 6), student_record_id=record_id))
+
+    # Each failed flush tries the batch and then the first scan on its own
+    for _ in range(5):
+        assert await ingestor.flush() == 0
+        assert ingestor.pending_count == len(record_ids)
+    assert ingestor._retry_delay > ingestor.flush_interval
+
+    assert await ingestor.flush() == len(record_ids)
+    assert ingestor.pending_count == 0
+    assert ingestor._retry_delay == 0
+    assert await stored(session_id, class_id) == (sorted(record_ids), [(record_id, "P") for record_id in sorted(record_ids)])
+
+async def test_scan_for_deleted_record_is_dropped_without_losing_the_rest(client, make_teacher):
+    from sqlalchemy import delete
+    from database import AsyncSessionLocal
+    from models import StudentRecord
+    from scan_ingest import ScanIngestor, PendingScan
+
+    teacher_id, _, (class_id,) = await make_teacher(classes=1, students=3)
+    session_id, record_ids = await open_session(class_id, teacher_id)
+
+    ingestor = ScanIngestor()
+    for record_id in record_ids:
+        ingestor.submit(PendingScan(class_id=class_id, session_id=session_id,
+                                    attendance_date=date(2025, 12, 6), student_record_id=record_id))
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(StudentRecord).where(StudentRecord.id == record_ids[0]))
+        await db.commit()
+
+    assert await ingestor.flush() == len(record_ids) - 1
+    assert ingestor.pending_count == 0
+    scans, _ = await stored(session_id, class_id)
+    assert scans == sorted(record_ids[1:])
+
+async def test_scan_buffered_in_another_worker_is_discarded_after_stop(client, make_teacher):
+    from scan_ingest import ScanIngestor, PendingScan
+
+    teacher_id, headers, (class_id,) = await make_teacher(classes=1, students=2)
+    session_id, record_ids = await open_session(class_id, teacher_id)
+
+    # Stands in for another worker's buffer, which the stop request can't flush
+    other_worker = ScanIngestor()
+    other_worker.submit(PendingScan(class_id=class_id, session_id=session_id,
+                                    attendance_date=date(2025, 12, 6), student_record_id=record_ids[0]))
+
+    stopped = await client.post("/qr/stop-session", json={"class_id": class_id}, headers=headers)
+    assert stopped.status_code == 200, stopped.text
+    assert stopped.json()["absent_count"] == len(record_ids)
+
+    assert await other_worker.flush() == 0
+    assert other_worker.pending_count == 0
+    assert await stored(session_id, class_id) == ([], [(record_id, "A") for record_id in sorted(record_ids)])
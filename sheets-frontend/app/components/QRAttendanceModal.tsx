@@ -61,8 +61,8 @@ export const QRAttendanceModal: React.FC<QRAttendanceModalProps> = ({
             // 1) mark session active so UI switches to QR view
             setIsActive(true);
             setCurrentCode(data.session.current_code);
-            setScannedCount(data.session.scanned_students?.length ?? 0);
-            setTimeLeft(rotationInterval);
+            setScannedCount(data.session.scanned_count ?? 0);
+            setTimeLeft(data.session.expires_in ? Math.ceil(data.session.expires_in) : rotationInterval);
 
             // 2) generate QR image
             const qrData = JSON.stringify({
@@ -84,55 +84,103 @@ export const QRAttendanceModal: React.FC<QRAttendanceModalProps> = ({
         }
     };
 
-    // Poll for session updates
+    // Stream session updates (code rotations and scans) pushed by the server
     useEffect(() => {
         if (!isActive) return;
 
-        const interval = setInterval(async () => {
-            try {
-                const token = localStorage.getItem('access_token');
-                if (!token) return;
-
-                const res = await fetch(
-                    `${process.env.NEXT_PUBLIC_API_URL}/qr/session/${classId}`,
-                    {
-                        headers: {
-                            Authorization: `Bearer ${token}`,
-                        },
-                    }
-                );
+        const controller = new AbortController();
 
-                if (!res.ok) return;
-                const data = await res.json();
-                if (!data.active || !data.session) return;
+        const showCode = async (code: string, expiresIn?: number) => {
+            setCurrentCode(code);
+            // codes rotate on fixed time windows, so the first one may live shorter
+            setTimeLeft(expiresIn ? Math.ceil(expiresIn) : rotationInterval);
 
-                setScannedCount(data.session.scanned_students.length);
+            const qrData = JSON.stringify({
+                class_id: String(classId),
+                code,
+            });
 
-                if (data.session.current_code !== currentCode) {
-                    // new code from backend
-                    setCurrentCode(data.session.current_code);
-                    setTimeLeft(rotationInterval);
+            const url = await QRCode.toDataURL(qrData, {
+                width: 300,
+                margin: 2,
+                color: { dark: '#059669', light: '#ffffff' },
+            });
+
+            setQrCodeUrl(url);
+        };
+
+        const handleEvent = async (type: string, data: any) => {
+            if (typeof data.scanned_count === 'number') {
+                setScannedCount(data.scanned_count);
+            }
+            if ((type === 'session' || type === 'code') && data.current_code) {
+                await showCode(data.current_code, data.expires_in);
+            }
+        };
 
-                    const qrData = JSON.stringify({
-                        class_id: String(classId),
-                        code: data.session.current_code,
-                    });
+        // resolves true once the session is over and there is nothing to reconnect to
+        const listen = async (): Promise<boolean> => {
+            const token = localStorage.getItem('access_token');
+            if (!token) return true;
 
-                    const url = await QRCode.toDataURL(qrData, {
-                        width: 300,
-                        margin: 2,
-                        color: { dark: '#059669', light: '#ffffff' },
-                    });
+            const res = await fetch(
+                `${process.env.NEXT_PUBLIC_API_URL}/qr/session/${classId}/stream`,
+                {
+                    headers: {
+                        Authorization: `Bearer ${token}`,
+                    },
+                    signal: controller.signal,
+                }
+            );
 
-                    setQrCodeUrl(url);
+            if (res.status === 404) return true;
+            if (!res.ok || !res.body) return false;
+
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let type = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event:')) type = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    if (data) await handleEvent(type, JSON.parse(data));
+                    if (type === 'stopped') return true;
                 }
-            } catch (e) {
-                console.error('Poll error', e);
             }
-        }, 1000);
+            return false;
+        };
+
+        // reconnect if the stream drops while the session is still running
+        const run = async () => {
+            while (!controller.signal.aborted) {
+                try {
+                    if (await listen()) return;
+                } catch (e: any) {
+                    if (e?.name === 'AbortError') return;
+                    console.error('Stream error', e);
+                }
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        };
+
+        run();
 
-        return () => clearInterval(interval);
-    }, [isActive, classId, currentCode, rotationInterval]);
+        return () => controller.abort();
+    }, [isActive, classId, rotationInterval]);
 
 
     // Countdown timer
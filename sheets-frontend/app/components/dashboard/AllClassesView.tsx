@@ -2,6 +2,7 @@
 
 import React from 'react';
 import { ArrowLeft, GraduationCap, Users, Calendar, TrendingUp, TrendingDown, AlertCircle } from 'lucide-react';
+import { attendanceDateKey } from '@/lib/classService';
 
 interface CustomColumn {
   id: string;
@@ -69,7 +70,7 @@ export const AllClassesView: React.FC<AllClassesViewProps> = ({
         let studentTotal = 0;
 
         for (let day = 1; day <= daysInMonth; day++) {
-          const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+          const dateKey = attendanceDateKey(currentYear, currentMonth, day);
           const status = student.attendance[dateKey];
           if (status) {
             studentTotal++;
@@ -114,7 +115,7 @@ export const AllClassesView: React.FC<AllClassesViewProps> = ({
       let studentTotal = 0;
 
       for (let day = 1; day <= daysInMonth; day++) {
-        const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+        const dateKey = attendanceDateKey(currentYear, currentMonth, day);
         const status = student.attendance[dateKey];
         if (status) {
           studentTotal++;
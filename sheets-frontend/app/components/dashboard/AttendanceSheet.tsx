@@ -7,6 +7,7 @@ import Papa from 'papaparse';
 import jsPDF from 'jspdf';
 import autoTable from 'jspdf-autotable';
 import * as XLSX from 'xlsx';
+import { attendanceDateKey } from '@/lib/classService';
 
 interface CustomColumn {
   id: string;
@@ -94,7 +95,7 @@ export const AttendanceSheet: React.FC<AttendanceSheetProps> = ({
     let total = 0;
 
     for (let day = 1; day <= daysInMonth; day++) {
-      const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+      const dateKey = attendanceDateKey(currentYear, currentMonth, day);
       const status = student.attendance[dateKey];
       if (status) {
         total++;
@@ -158,7 +159,7 @@ export const AttendanceSheet: React.FC<AttendanceSheetProps> = ({
     if (exportOnlyClassDays) {
       // Only include days where at least one student has attendance marked
       for (let day = 1; day <= daysInMonth; day++) {
-        const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+        const dateKey = attendanceDateKey(currentYear, currentMonth, day);
         const hasAttendance = activeClass.students.some(student => student.attendance[dateKey]);
         if (hasAttendance) {
           daysToInclude.push(day);
@@ -210,7 +211,7 @@ export const AttendanceSheet: React.FC<AttendanceSheetProps> = ({
 
       // Day columns
       daysToInclude.forEach(day => {
-        const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+        const dateKey = attendanceDateKey(currentYear, currentMonth, day);
         const status = student.attendance[dateKey];
         row[`${day}`] = status || '';
 
@@ -879,7 +880,7 @@ export const AttendanceSheet: React.FC<AttendanceSheetProps> = ({
 
                     {Array.from({ length: daysInMonth }, (_, dayIdx) => {
                       const day = dayIdx + 1;
-                      const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+                      const dateKey = attendanceDateKey(currentYear, currentMonth, day);
                       const status = student.attendance[dateKey];
 
                       return (
@@ -1,9 +1,10 @@
 'use client';
 
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
 import { Calendar, Users, TrendingUp, AlertCircle, Award, BarChart3, Settings, GraduationCap } from 'lucide-react';
-import { Class, Student, CustomColumn, AttendanceThresholds } from '@/types';
+import { Class, AttendanceThresholds } from '@/types';
+import { classService, MonthlySnapshot } from '@/lib/classService';
 
 interface SnapshotViewProps {
   classes: Class[];
@@ -19,122 +20,48 @@ export const SnapshotView: React.FC<SnapshotViewProps> = ({
   defaultThresholds,
 }) => {
   const router = useRouter()
-  const getDaysInMonth = (month: number, year: number) => 
-    new Date(year, month + 1, 0).getDate();
-  
-  const daysInMonth = getDaysInMonth(currentMonth, currentYear);
+  const [snapshot, setSnapshot] = useState<MonthlySnapshot | null>(null);
+
+  // Aggregates are computed by the backend; refetch when the month or the classes change
+  useEffect(() => {
+    let cancelled = false;
+    classService
+      .getSnapshot(currentMonth + 1, currentYear)
+      .then(data => {
+        if (!cancelled) setSnapshot(data);
+      })
+      .catch(error => console.error('Error loading snapshot:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [classes, currentMonth, currentYear]);
+
   const monthName = new Date(currentYear, currentMonth).toLocaleString('default', { 
     month: 'long', 
     year: 'numeric' 
   });
 
-  // Calculate overall statistics
-  const calculateOverallStats = () => {
-    let totalStudents = 0;
-    let totalPresent = 0;
-    let totalPossible = 0;
-    let atRiskCount = 0;
-    let excellentCount = 0;
-
-    classes.forEach(cls => {
-      const thresholds = cls.thresholds || defaultThresholds;
-      totalStudents += cls.students.length;
-      
-      cls.students.forEach(student => {
-        let studentPresent = 0;
-        let studentTotal = 0;
-
-        for (let day = 1; day <= daysInMonth; day++) {
-          const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
-          const status = student.attendance[dateKey];
-          if (status) {
-            studentTotal++;
-            if (status === 'P' || status === 'L') studentPresent++;
-          }
-        }
-
-        totalPresent += studentPresent;
-        totalPossible += studentTotal;
-
-        const percentage = studentTotal > 0 ? (studentPresent / studentTotal) * 100 : 0;
-        if (percentage < thresholds.atRisk) atRiskCount++;
-        if (percentage >= thresholds.excellent) excellentCount++;
-      });
-    });
-
-    const overallAttendance = totalPossible > 0 ? (totalPresent / totalPossible) * 100 : 0;
-
-    return {
-      totalClasses: classes.length,
-      totalStudents,
-      overallAttendance: overallAttendance.toFixed(1),
-      atRiskCount,
-      excellentCount,
-    };
-  };
-
-  // Calculate per-class statistics
-  const calculateClassStats = (cls: Class) => {
-    const thresholds = cls.thresholds || defaultThresholds;
-    let totalPresent = 0;
-    let totalPossible = 0;
-    let atRiskCount = 0;
-    let excellentCount = 0;
-    const studentStats: Array<{
-      student: Student;
-      attendance: number;
-      status: 'excellent' | 'good' | 'moderate' | 'risk';
-    }> = [];
-
-    cls.students.forEach(student => {
-      let studentPresent = 0;
-      let studentTotal = 0;
-
-      for (let day = 1; day <= daysInMonth; day++) {
-        const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
-        const status = student.attendance[dateKey];
-        if (status) {
-          studentTotal++;
-          if (status === 'P' || status === 'L') studentPresent++;
-        }
-      }
-
-      totalPresent += studentPresent;
-      totalPossible += studentTotal;
-
-      const percentage = studentTotal > 0 ? (studentPresent / studentTotal) * 100 : 0;
-      
-      let status: 'excellent' | 'good' | 'moderate' | 'risk';
-      if (percentage >= thresholds.excellent) {
-        excellentCount++;
-        status = 'excellent';
-      } else if (percentage >= thresholds.good) {
-        status = 'good';
-      } else if (percentage >= thresholds.moderate) {
-        status = 'moderate';
-      } else {
-        atRiskCount++;
-        status = 'risk';
-      }
-
-      studentStats.push({ student, attendance: percentage, status });
-    });
-
-    const avgAttendance = totalPossible > 0 ? (totalPresent / totalPossible) * 100 : 0;
-
-    return {
-      avgAttendance: avgAttendance.toFixed(1),
-      studentCount: cls.students.length,
-      atRiskCount,
-      excellentCount,
-      studentStats: studentStats.sort((a, b) => b.attendance - a.attendance),
-    };
+  const overallStats = {
+    totalClasses: snapshot?.overall.total_classes ?? classes.length,
+    totalStudents: snapshot?.overall.total_students ?? 0,
+    overallAttendance: (snapshot?.overall.overall_attendance ?? 0).toFixed(1),
+    atRiskCount: snapshot?.overall.at_risk_count ?? 0,
+    excellentCount: snapshot?.overall.excellent_count ?? 0,
   };
 
-  const overallStats = calculateOverallStats();
-  const classesWithStats = classes.map(cls => ({
+  const classesWithStats = (snapshot?.classes ?? []).map(cls => ({
     class: cls,
-    stats: calculateClassStats(cls),
+    stats: {
+      avgAttendance: cls.avg_attendance.toFixed(1),
+      studentCount: cls.student_count,
+      atRiskCount: cls.at_risk_count,
+      excellentCount: cls.excellent_count,
+      studentStats: cls.students.map(student => ({
+        student,
+        attendance: student.attendance,
+        status: student.status === 'at risk' ? 'risk' : student.status,
+      })),
+    },
   }));
 
   const getStatusColor = (status: string) => {
@@ -3,7 +3,7 @@
 import React, { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import { useAuth } from '@/lib/auth-context-email';
-import { classService, Class } from '@/lib/classService';
+import { classService, Class, AttendanceChange, attendanceDateKey } from '@/lib/classService';
 import { Menu, User, Users, LayoutDashboard } from 'lucide-react';
 
 import { Sidebar } from '../components/dashboard/Sidebar';
@@ -187,23 +187,16 @@ export default function DashboardPage() {
     const dataToSave = {
       classId: activeClass.id,
       className: activeClass.name,
-      month: currentMonth,
+      month: currentMonth + 1, // the API takes 1-12; currentMonth is 0-based
       year: currentYear,
       students: [], // AttendanceSheet will pass real student data
       thresholds: { excellent: 90, good: 80, moderate: 70, atRisk: 50 }
     };
   
     try {
-      const response = await fetch('/api/attendance/save', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(dataToSave)
-      });
-      
-      if (response.ok) {
-        console.log("✅ Sheet SAVED for", activeClass.name);
-        toast.success("Attendance saved successfully!");
-      }
+      await classService.saveSheet(dataToSave);
+      console.log("✅ Sheet SAVED for", activeClass.name);
+      toast.success("Attendance saved successfully!");
     } catch (error) {
       console.error("❌ Save failed:", error);
       toast.error("Failed to save attendance");
@@ -214,16 +207,10 @@ export default function DashboardPage() {
     if (!activeClass) return;
     
     try {
-      const response = await fetch(
-        `/api/attendance/load/${activeClass.id}?month=${currentMonth}&year=${currentYear}`
-      );
-      
-      if (response.ok) {
-        const data = await response.json();
-        setSheetData(data);
-        console.log("✅ Sheet LOADED for", activeClass.name);
-        toast.success("Attendance loaded!");
-      }
+      const data = await classService.loadSheet(String(activeClass.id), currentMonth + 1, currentYear);
+      setSheetData(data);
+      console.log("✅ Sheet LOADED for", activeClass.name);
+      toast.success("Attendance loaded!");
     } catch (error) {
       console.error("❌ Load failed:", error);
     }
@@ -485,7 +472,7 @@ export default function DashboardPage() {
   const handleToggleAttendance = (studentId: number, day: number) => {
     if (!activeClassId) return;
 
-    const dateKey = `${currentYear}-${currentMonth + 1}-${day}`;
+    const dateKey = attendanceDateKey(currentYear, currentMonth, day);
 
     const updatedClasses = classes.map(cls =>
       cls.id === activeClassId
@@ -524,7 +511,29 @@ export default function DashboardPage() {
     setClasses(sanitizedClasses);
 
     const updatedClass = sanitizedClasses.find(c => c.id === activeClassId);
-    if (updatedClass) {
+    const updatedStudent = updatedClass?.students.find(s => s.id === studentId);
+    if (updatedClass && updatedStudent) {
+      saveAttendanceCell(updatedClass, sanitizedClasses, {
+        student_id: studentId,
+        date: dateKey,
+        status: updatedStudent.attendance[dateKey] ?? null,
+      });
+    }
+  };
+
+  // Save a single attendance cell: localStorage immediately, backend as a delta
+  const saveAttendanceCell = async (updatedClass: Class, updatedClasses: Class[], change: AttendanceChange) => {
+    if (user) {
+      localStorage.setItem(`classes_${user.id}`, JSON.stringify(updatedClasses));
+    }
+
+    try {
+      const result = await classService.patchAttendance(String(updatedClass.id), [change]);
+      setClasses(prev => prev.map(c => (c.id === updatedClass.id ? { ...c, version: result.version } : c)));
+      setSyncError('');
+    } catch (error) {
+      console.error('Error saving attendance to backend:', error);
+      // fall back to a full save so the backend still converges
       saveClass(updatedClass);
     }
   };
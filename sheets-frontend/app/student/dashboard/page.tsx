@@ -84,7 +84,7 @@ export default function StudentDashboard() {
     try {
       setLoading(true);
       const token = localStorage.getItem('accesstoken');
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/student/classes`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/student/classes?include_attendance=false`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
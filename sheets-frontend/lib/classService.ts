@@ -47,6 +47,7 @@ export interface Class {
   customColumns: CustomColumn[];
   thresholds?: AttendanceThresholds;
   statistics?: ClassStatistics;
+  version?: number;
   teacher_id?: string;
   created_at?: string;
   updated_at?: string;
@@ -67,6 +68,63 @@ type ClassRequestPayload = {
   thresholds?: AttendanceThresholds;
 };
 
+// ✅ Attendance keys are ISO dates ("2025-12-06"), as stored by the backend
+export const attendanceDateKey = (year: number, monthIndex: number, day: number): string =>
+  `${year}-${String(monthIndex + 1).padStart(2, "0")}-${String(day).padStart(2, "0")}`;
+
+// ✅ Single attendance cell edit for PATCH /classes/{id}/attendance
+export interface AttendanceChange {
+  student_id: number;
+  date: string;
+  status: "P" | "A" | "L" | null;
+}
+
+export interface AttendancePatchResult {
+  success: boolean;
+  class_id: string;
+  version: number;
+  applied: number;
+}
+
+// ✅ GET /snapshot - month aggregates computed by the backend
+export type SnapshotStatus = "excellent" | "good" | "moderate" | "at risk";
+
+export interface SnapshotStudent {
+  id: number;
+  name: string;
+  rollNo: string;
+  present: number;
+  absent: number;
+  late: number;
+  total: number;
+  attendance: number;
+  status: SnapshotStatus;
+}
+
+export interface SnapshotClass {
+  id: string;
+  name: string;
+  thresholds: AttendanceThresholds;
+  student_count: number;
+  avg_attendance: number;
+  at_risk_count: number;
+  excellent_count: number;
+  students: SnapshotStudent[];
+}
+
+export interface MonthlySnapshot {
+  year: number;
+  month: number;
+  overall: {
+    total_classes: number;
+    total_students: number;
+    overall_attendance: number;
+    at_risk_count: number;
+    excellent_count: number;
+  };
+  classes: SnapshotClass[];
+}
+
 class ClassService {
   private getAuthHeaders(): Record<string, string> {
     const token =
@@ -188,6 +246,52 @@ class ClassService {
     }
   }
 
+  async patchAttendance(
+    classId: string,
+    changes: AttendanceChange[],
+    baseVersion?: number
+  ): Promise<AttendancePatchResult> {
+    try {
+      return await this.apiCall<AttendancePatchResult>(
+        `/classes/${classId}/attendance`,
+        {
+          method: "PATCH",
+          body: JSON.stringify({ changes, base_version: baseVersion }),
+        }
+      );
+    } catch (error) {
+      console.error("Error patching attendance:", error);
+      throw error;
+    }
+  }
+
+  async saveSheet(sheet: Record<string, any>): Promise<{ status: string; key: string; students_count: number }> {
+    try {
+      return await this.apiCall("/api/attendance/save", {
+        method: "POST",
+        body: JSON.stringify(sheet),
+      });
+    } catch (error) {
+      console.error("Error saving sheet:", error);
+      throw error;
+    }
+  }
+
+  // month is 1-12
+  async loadSheet(classId: string, month: number, year: number): Promise<any> {
+    return this.apiCall(
+      `/api/attendance/load/${classId}?month=${month}&year=${year}`
+    );
+  }
+
+  // month is 1-12
+  async getSnapshot(month: number, year: number): Promise<MonthlySnapshot> {
+    const result = await this.apiCall<{ snapshot: MonthlySnapshot }>(
+      `/snapshot?month=${month}&year=${year}`
+    );
+    return result.snapshot;
+  }
+
   async deleteClass(classId: string): Promise<boolean> {
     try {
       const result = await this.apiCall<{ success: boolean; message: string }>(